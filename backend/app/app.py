@@ -2,13 +2,22 @@ from contextlib import asynccontextmanager
 
 import pandas as pd
 from fastapi import FastAPI
+from sqlalchemy import select, String, Integer
 
-from .ecocrop_transformer import transform_ecocrop_data
-from .database import async_session_maker, engine
+from .autocomplete import build_autocomplete_index
+from .catalog import catalog
+from .database import async_session_maker, engine, insert_ignoring_conflicts
+from .geocoding import geocoder
+from .http_client import http_client
 from .logger import logger
 from .models import Plant, Base
 from .plant_router import get_plant_router
+from .query_embeddings import query_embedder
 from .rag_router import get_rag_router
+from .search import create_search_indexes
+from .snapshot import load_cleaned_dataset
+from .suitability import build_suitability_tables
+from .weather_cache import weather_cache
 
 
 @asynccontextmanager
@@ -18,7 +27,16 @@ async def lifespan(app: FastAPI):
         await conn.run_sync(Base.metadata.create_all)
         logger.info("Database schema created successfully.")
 
+    try:
+        async with engine.begin() as conn:
+            await create_search_indexes(conn)
+    except Exception as e:
+        logger.warning(f"Trigram search indexes unavailable, using the in-memory search index: {e!r}")
+
+    geocoder.load_gazetteer()
+
     # logger.info("Creating cleaned dataset")
+    # from .ecocrop_transformer import transform_ecocrop_data
     # transform_ecocrop_data()
     # logger.info("Finished creating cleaned dataset")
 
@@ -26,8 +44,18 @@ async def lifespan(app: FastAPI):
     await load_data()
     logger.info("Finished Loading Plants into DB")
 
+    # Listen first: changes committed by other replicas while the catalog loads must not be missed
+    await catalog.listen(engine)
+    async with async_session_maker() as session:
+        await catalog.load(session)
+    build_autocomplete_index()
+    build_suitability_tables()
+
     yield
     logger.info("Shutting down API...")
+    await catalog.stop()
+    await http_client.aclose()
+    query_embedder.cache.save()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -49,79 +77,60 @@ async def root():
     return {"message": "Hello World"}
 
 
+@app.get("/metrics/cache")
+async def cache_metrics():
+    """Hit/miss statistics of the in-process caches."""
+    return {
+        "weather": weather_cache.stats(),
+        "geocoding": geocoder.stats(),
+        "query_embeddings": query_embedder.stats(),
+    }
+
+
+def _plant_records(df: pd.DataFrame) -> list[dict]:
+    """
+    Convert the cleaned dataset into insert parameters for the plants table.
+
+    Columns and their conversions are derived from the Plant table metadata: string columns use empty
+    strings for missing values, numeric columns use None. Columns missing from the file are loaded as NULL.
+    """
+    columns = {}
+    for column in Plant.__table__.columns:
+        if column.name not in df.columns:
+            columns[column.name] = [None] * len(df)
+            continue
+
+        series = df[column.name]
+        if isinstance(column.type, String):
+            if pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+                values = series.fillna("").astype(str).astype(object)
+            else:
+                values = series.astype(str).astype(object).where(series.notna(), None)
+        elif isinstance(column.type, Integer):
+            values = series.astype(object)
+        else:
+            series = pd.to_numeric(series, errors="coerce")
+            values = series.astype(object).where(series.notna(), None)
+        columns[column.name] = values.tolist()
+
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*columns.values())]
+
+
 async def load_data():
-    async with async_session_maker() as session:
-        # Load data from Excel file
-        df = pd.read_excel('resources/Cleaned_EcoCrop_DB_Final.xlsx')
+    # Load the cleaned dataset, preferring the memory-mapped snapshot over the Excel export
+    df = load_cleaned_dataset(columns=[column.name for column in Plant.__table__.columns])
+    df = df.drop_duplicates(subset="EcoPortCode")
 
-        # Replace NaN values: use empty strings for string columns and None for numeric columns
-        for column in df.columns:
-            if df[column].dtype == "object":
-                df[column] = df[column].fillna("")  # Replace NaN with empty string for string columns
-            else:
-                df[column] = df[column].where(pd.notnull(df[column]), None)  # Replace NaN with None for numeric columns
-
-        # Convert DataFrame to list of Plant objects
-        plants = []
-        for _, row in df.iterrows():
-            # Check if the record already exists
-            existing_plant = await session.get(Plant, row['EcoPortCode'])
-            if existing_plant is None:
-                plant = Plant(
-                    EcoPortCode=row['EcoPortCode'],
-                    ScientificName=row['ScientificName'],
-                    AUTH=row['AUTH'],
-                    FAMNAME=row['FAMNAME'],
-                    SYNO=row['SYNO'],
-                    COMNAME=row['COMNAME'],
-                    LIFO=row['LIFO'],
-                    HABI=row['HABI'],
-                    LISPA=row['LISPA'],
-                    PHYS=row['PHYS'],
-                    CAT=row['CAT'],
-                    PLAT=row['PLAT'],
-                    TOPMN=row['TOPMN'],
-                    TOPMX=row['TOPMX'],
-                    TMIN=row['TMIN'],
-                    TMAX=row['TMAX'],
-                    ROPMN=row['ROPMN'],
-                    ROPMX=row['ROPMX'],
-                    RMIN=row['RMIN'],
-                    RMAX=row['RMAX'],
-                    KTMP=row['KTMP'],
-                    GMIN=row['GMIN'],
-                    GMAX=row['GMAX'],
-                    LATOPMN=row.get('LATOPMN'),
-                    LATOPMX=row.get('LATOPMX'),
-                    LATMN=row.get('LATMN'),
-                    LATMX=row.get('LATMX'),
-                    ALTMX=row.get('ALTMX'),
-                    LIOPMN=row.get('LIOPMN'),
-                    LIOPMX=row.get('LIOPMX'),
-                    LIMN=row.get('LIMN'),
-                    LIMX=row.get('LIMX'),
-                    DEP=row.get('DEP'),
-                    DEPR=row.get('DEPR'),
-                    TEXT=row.get('TEXT'),
-                    TEXTR=row.get('TEXTR'),
-                    FER=row.get('FER'),
-                    FERR=row.get('FERR'),
-                    TOX=row.get('TOX'),
-                    TOXR=row.get('TOXR'),
-                    SAL=row.get('SAL'),
-                    SALR=row.get('SALR'),
-                    DRA=row.get('DRA'),
-                    DRAR=row.get('DRAR'),
-                    KTMPR=row.get('KTMPR'),
-                    PHOTO=row.get('PHOTO'),
-                    CLIZ=row.get('CLIZ'),
-                    ABITOL=row.get('ABITOL'),
-                    ABISUS=row.get('ABISUS'),
-                    INTRI=row.get('INTRI'),
-                    PROSY=row.get('PROSY'),
-                )
-                plants.append(plant)
-
-        if plants:
-            session.add_all(plants)
+    async with async_session_maker() as session:
+        # Diff against the plants already in the database with a single query
+        result = await session.execute(select(Plant.EcoPortCode))
+        existing_codes = set(result.scalars().all())
+        df = df[~df["EcoPortCode"].isin(existing_codes)]
+
+        records = _plant_records(df)
+        if records:
+            # executemany over an INSERT is sent as batched multi-row INSERT statements
+            await session.execute(insert_ignoring_conflicts(Plant), records)
             await session.commit()
+        logger.info(f"Inserted {len(records)} new plants, {len(existing_codes)} already present")
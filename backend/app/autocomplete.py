@@ -0,0 +1,107 @@
+import bisect
+
+from .catalog import catalog
+from .field_parser import normalize_unicode
+from .logger import logger
+from .models import PlantModel
+
+# Plant fields offered as completions, in the order suggestions of equal rank are preferred
+AUTOCOMPLETE_FIELDS = ("ScientificName", "COMNAME", "SYNO")
+
+
+def normalize_prefix(text: str) -> str:
+    """Fold a name or typed prefix to the form stored in the index (ASCII, lowercase, single spaces)."""
+    return " ".join(normalize_unicode(text).lower().split())
+
+
+def _completions(plant: PlantModel):
+    """
+    (field, text) pairs offered for a plant: its scientific name and every common name and synonym,
+    split on commas but otherwise as written in the database, since the text is what the user sees.
+    """
+    yield "ScientificName", plant.ScientificName
+    for field in AUTOCOMPLETE_FIELDS[1:]:
+        for text in (getattr(plant, field) or "").split(","):
+            text = text.strip()
+            if text:
+                yield field, text
+
+
+class PrefixIndex:
+    """
+    Sorted-array prefix index over plant names.
+
+    Every completion is stored under its normalized form, once at the start of the name and, except for
+    synonyms, once per following word, so "wattle" also completes "golden wattle". A lookup is a binary
+    search followed by a scan of the matching keys until `limit` plants are found; further keys of a plant
+    already suggested are skipped without counting toward the limit. Whole-name matches come before
+    word matches.
+    The index follows the catalog through add/remove, see PlantCatalog.subscribe.
+    """
+
+    def __init__(self):
+        # Sorted lists of (key, field rank, text, eco_port_code)
+        self._names = []
+        self._words = []
+        self._keys_by_code = {}
+
+    def __len__(self):
+        return len(self._names)
+
+    def clear(self):
+        self._names.clear()
+        self._words.clear()
+        self._keys_by_code.clear()
+
+    def add(self, plant: PlantModel):
+        self.remove(plant.EcoPortCode)
+        keys = []
+        for field, text in _completions(plant):
+            key = normalize_prefix(text)
+            if not key:
+                continue
+            entry = (key, AUTOCOMPLETE_FIELDS.index(field), text, plant.EcoPortCode)
+            bisect.insort(self._names, entry)
+            keys.append((self._names, entry))
+            # Later words of synonyms are mostly author citations and are not worth completing
+            words = key.split(" ") if field != "SYNO" else [key]
+            for i in range(1, len(words)):
+                word_entry = (" ".join(words[i:]),) + entry[1:]
+                bisect.insort(self._words, word_entry)
+                keys.append((self._words, word_entry))
+        self._keys_by_code[plant.EcoPortCode] = keys
+
+    def remove(self, eco_port_code):
+        for entries, entry in self._keys_by_code.pop(eco_port_code, ()):
+            del entries[bisect.bisect_left(entries, entry)]
+
+    def complete(self, prefix, limit=10):
+        """
+        Return up to `limit` suggestions (eco_port_code, field, text) for a typed prefix,
+        at most one per plant.
+        """
+        prefix = normalize_prefix(prefix)
+        if not prefix:
+            return []
+        suggestions = []
+        seen = set()
+        for entries in (self._names, self._words):
+            i = bisect.bisect_left(entries, (prefix,))
+            while i < len(entries) and len(suggestions) < limit:
+                key, field_rank, text, code = entries[i]
+                if not key.startswith(prefix):
+                    break
+                if code not in seen:
+                    seen.add(code)
+                    suggestions.append((code, AUTOCOMPLETE_FIELDS[field_rank], text))
+                i += 1
+        return suggestions
+
+
+autocomplete_index = PrefixIndex()
+
+
+def build_autocomplete_index():
+    """Fill the index from the catalog and keep it updated on every catalog change."""
+    catalog.subscribe(autocomplete_index)
+    logger.info(f"Built autocomplete index with {len(autocomplete_index)} names")
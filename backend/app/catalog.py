@@ -0,0 +1,313 @@
+import asyncio
+import bisect
+import hashlib
+import json
+import math
+import os
+
+import asyncpg
+from sqlalchemy import select, func
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from .database import async_session_maker
+from .logger import logger
+from .models import Plant, PlantModel
+
+# Postgres NOTIFY channel used to keep the catalogs of all replicas coherent
+CATALOG_CHANNEL = "plant_catalog"
+# Seconds between attempts to reconnect the notification listener or reload the catalog after a failure
+CATALOG_RETRY_SECONDS = float(os.getenv("CATALOG_RETRY_SECONDS", 5))
+# Failures of the database connection; the listener talks to asyncpg directly, so its errors are not wrapped
+CONNECTION_ERRORS = (SQLAlchemyError, OSError, asyncpg.PostgresError, asyncpg.InterfaceError)
+
+
+def _replace_nan_with_none(plant):
+    """
+    Replace NaN values with None for a Plant object.
+
+    This function iterates over all attributes of a Plant object. If a float
+    attribute is NaN, it replaces the value with None.
+
+    :param plant: The Plant object to process.
+    :return: The processed Plant object with NaN values replaced by None.
+    """
+    for field, value in plant.__dict__.items():
+        if isinstance(value, float) and math.isnan(value):
+            setattr(plant, field, None)
+    return plant
+
+
+class PlantCatalog:
+    """
+    Read-through, in-process cache of the plant table.
+
+    Every plant is kept as a validated PlantModel and as pre-serialized JSON, indexed by EcoPortCode
+    and by lowercase scientific name, so read endpoints never touch the database. Writes go through
+    upsert/remove; publish/listen propagate them to other replicas via Postgres LISTEN/NOTIFY. Whenever
+    notifications may have been missed (a lost listener connection, a failed refresh) the whole catalog
+    is reloaded.
+    `version` increases with every change so derived structures know when to rebuild; structures that
+    are cheaper to update in place subscribe to the individual changes instead.
+    """
+
+    def __init__(self):
+        self._plants = {}
+        self._json = {}
+        self._documents = {}
+        self._hashes = {}
+        self._by_name = {}
+        self._codes = []
+        # Order-independent digest of the catalog content, identical on replicas with identical data
+        self._digest = 0
+        self.version = 0
+        self._engine = None
+        self._listener = None
+        self._driver_connection = None
+        self._reconnect_task = None
+        self._reload_task = None
+        # Codes notified while load() reads the table, refreshed once it is done
+        self._notified_during_load = None
+        self._refresh_tasks = set()
+        self._observers = []
+
+    def __len__(self):
+        return len(self._plants)
+
+    async def load(self, session: AsyncSession):
+        """Replace the catalog with the current content of the plant table."""
+        # A change notified while the table is read may or may not be part of the result
+        self._notified_during_load = set()
+        try:
+            result = await session.execute(select(Plant).order_by(Plant.EcoPortCode))
+            plants = result.scalars().all()
+        finally:
+            notified, self._notified_during_load = self._notified_during_load, None
+        self._plants.clear()
+        self._json.clear()
+        self._documents.clear()
+        self._hashes.clear()
+        self._by_name.clear()
+        self._codes.clear()
+        self._digest = 0
+        for observer in self._observers:
+            observer.clear()
+        for plant in plants:
+            self._put(PlantModel.model_validate(_replace_nan_with_none(plant)))
+        self.version += 1
+        logger.info(f"Loaded {len(self._plants)} plants into the catalog")
+        for code in notified:
+            self._schedule_refresh(code)
+
+    def _put(self, model: PlantModel):
+        self._drop(model.EcoPortCode)
+        code = model.EcoPortCode
+        self._plants[code] = model
+        self._json[code] = model.model_dump_json().encode()
+        self._documents[code] = model.model_dump(mode="json")
+        self._hashes[code] = int.from_bytes(hashlib.blake2b(self._json[code], digest_size=8).digest(), "big")
+        self._digest ^= self._hashes[code]
+        bisect.insort(self._codes, code)
+        codes = self._by_name.setdefault(model.ScientificName.lower(), [])
+        codes.append(code)
+        codes.sort()
+        for observer in self._observers:
+            observer.add(model)
+
+    def _drop(self, eco_port_code):
+        model = self._plants.pop(eco_port_code, None)
+        if model is None:
+            return
+        del self._json[eco_port_code]
+        del self._documents[eco_port_code]
+        self._digest ^= self._hashes.pop(eco_port_code)
+        del self._codes[bisect.bisect_left(self._codes, eco_port_code)]
+        name = model.ScientificName.lower()
+        self._by_name[name].remove(eco_port_code)
+        if not self._by_name[name]:
+            del self._by_name[name]
+        for observer in self._observers:
+            observer.remove(eco_port_code)
+
+    def subscribe(self, observer):
+        """
+        Keep `observer` in sync with the catalog. It is filled with the current plants and then receives
+        add(model), remove(eco_port_code) and clear() calls for every change.
+        """
+        self._observers.append(observer)
+        observer.clear()
+        for model in self.plants():
+            observer.add(model)
+
+    def upsert(self, plant):
+        """Insert or replace a plant given as ORM object or PlantModel."""
+        if not isinstance(plant, PlantModel):
+            plant = PlantModel.model_validate(_replace_nan_with_none(plant))
+        self._put(plant)
+        self.version += 1
+
+    def remove(self, eco_port_code):
+        self._drop(eco_port_code)
+        self.version += 1
+
+    def get(self, eco_port_code):
+        return self._plants.get(eco_port_code)
+
+    @property
+    def digest(self) -> str:
+        return f"{self._digest:016x}"
+
+    def codes(self, after=None, limit=None):
+        """
+        EcoPortCodes in ascending order, optionally as a keyset page:
+        the first `limit` codes greater than `after`.
+        """
+        start = 0 if after is None else bisect.bisect_right(self._codes, after)
+        end = None if limit is None else start + limit
+        return self._codes[start:end]
+
+    def plants(self):
+        """All plants in ascending EcoPortCode order."""
+        return [self._plants[code] for code in self.codes()]
+
+    def codes_by_scientific_name(self, scientific_name):
+        """Codes of the plants whose scientific name matches case-insensitively."""
+        return list(self._by_name.get(scientific_name.strip().lower(), []))
+
+    def first_by_scientific_name(self, scientific_name):
+        codes = self.codes_by_scientific_name(scientific_name)
+        return self._plants[codes[0]] if codes else None
+
+    def json_documents(self, codes, fields=None) -> list[bytes]:
+        """Serialized JSON object per plant, restricted to `fields` if given."""
+        if fields is None:
+            return [self._json[code] for code in codes]
+        return [
+            json.dumps({field: self._documents[code][field] for field in fields},
+                       separators=(",", ":"), ensure_ascii=False).encode()
+            for code in codes
+        ]
+
+    def json_array(self, codes, fields=None) -> bytes:
+        """Serialized JSON array of the given plants, assembled from the cached JSON documents."""
+        return b"[" + b",".join(self.json_documents(codes, fields)) + b"]"
+
+    async def publish(self, session: AsyncSession, *eco_port_codes):
+        """
+        Queue a change notification for other replicas. Call before committing the session:
+        Postgres delivers NOTIFY only when (and if) the transaction commits.
+        """
+        if session.bind.dialect.name != "postgresql":
+            return
+        for code in eco_port_codes:
+            await session.execute(select(func.pg_notify(CATALOG_CHANNEL, str(code))))
+
+    async def refresh(self, eco_port_code):
+        """
+        Reload a single plant from the database, removing it if it no longer exists. If that fails the
+        plant would stay stale, so the whole catalog is reloaded in the background instead.
+        """
+        try:
+            async with async_session_maker() as session:
+                plant = await session.get(Plant, eco_port_code)
+        except CONNECTION_ERRORS as e:
+            logger.warning(f"Refreshing plant {eco_port_code} failed, reloading the catalog: {e!r}")
+            self._schedule_reload()
+            return
+        if self._notified_during_load is not None:
+            # A running load() would overwrite the result with a possibly older read; refresh after it
+            self._notified_during_load.add(eco_port_code)
+            return
+        if plant is None:
+            self.remove(eco_port_code)
+        else:
+            self.upsert(plant)
+
+    def _schedule_refresh(self, eco_port_code):
+        task = asyncio.create_task(self.refresh(eco_port_code))
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
+
+    def _schedule_reload(self):
+        """Reload the whole catalog in the background unless a reload is already running."""
+        if self._reload_task is None or self._reload_task.done():
+            self._reload_task = asyncio.create_task(self._reload())
+
+    async def _reload(self):
+        while True:
+            try:
+                async with async_session_maker() as session:
+                    await self.load(session)
+                return
+            except CONNECTION_ERRORS as e:
+                logger.warning(f"Reloading the plant catalog failed, retrying in {CATALOG_RETRY_SECONDS}s: {e!r}")
+                await asyncio.sleep(CATALOG_RETRY_SECONDS)
+
+    def _on_notification(self, connection, pid, channel, payload):
+        if self._notified_during_load is not None:
+            self._notified_during_load.add(int(payload))
+        else:
+            self._schedule_refresh(int(payload))
+
+    async def listen(self, engine: AsyncEngine):
+        """
+        Subscribe to change notifications of other replicas on a dedicated connection. Call before
+        load(), so that no change committed in between is missed. If the connection is lost (database
+        restart, failover, idle timeout) it is re-established in the background and the catalog reloaded.
+        """
+        if engine.dialect.name != "postgresql":
+            return
+        self._engine = engine
+        await self._connect_listener()
+        logger.info(f"Listening for plant catalog changes on channel '{CATALOG_CHANNEL}'")
+
+    async def _connect_listener(self):
+        listener = await self._engine.connect()
+        try:
+            driver_connection = (await listener.get_raw_connection()).driver_connection
+            await driver_connection.add_listener(CATALOG_CHANNEL, self._on_notification)
+            driver_connection.add_termination_listener(self._on_listener_lost)
+        except BaseException:
+            await listener.invalidate()
+            raise
+        self._listener = listener
+        self._driver_connection = driver_connection
+
+    def _on_listener_lost(self, connection):
+        if self._engine is None or connection is not self._driver_connection:
+            return
+        logger.warning("Plant catalog listener connection lost, reconnecting")
+        self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        listener, self._listener, self._driver_connection = self._listener, None, None
+        try:
+            await listener.invalidate()
+        except CONNECTION_ERRORS:
+            pass
+        while self._engine is not None:
+            try:
+                await self._connect_listener()
+            except CONNECTION_ERRORS as e:
+                logger.warning(f"Reconnecting the plant catalog listener failed, retrying in {CATALOG_RETRY_SECONDS}s: {e!r}")
+                await asyncio.sleep(CATALOG_RETRY_SECONDS)
+                continue
+            # Notifications sent while disconnected are lost
+            logger.info("Plant catalog listener reconnected, reloading the catalog")
+            self._schedule_reload()
+            return
+
+    async def stop(self):
+        self._engine = None
+        for task in (self._reconnect_task, self._reload_task):
+            if task is not None:
+                task.cancel()
+        if self._listener is not None:
+            self._driver_connection.remove_termination_listener(self._on_listener_lost)
+            self._driver_connection = None
+            # Discard the connection instead of returning it to the pool with the LISTEN still active
+            await self._listener.invalidate()
+            self._listener = None
+
+
+catalog = PlantCatalog()
@@ -0,0 +1,32 @@
+import os
+
+import pandas as pd
+
+REPORT_PATH = os.path.join("resources", "data-report")
+
+
+def visualize_missing_values(df, title, filename):
+    # Plotting libraries are only needed for the optional report, import them on first use
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    na_counts = df.isna().sum()
+    empty_counts = (df == "").sum()
+    combined = na_counts + empty_counts
+    plt.figure(figsize=(15, 7))
+    sns.barplot(x=combined.index, y=combined.values, palette="viridis")
+    plt.xticks(rotation=90)
+    plt.title(title)
+    plt.ylabel("Missing / Empty Entries")
+    plt.tight_layout()
+    plt.savefig(filename)
+    plt.close()
+
+
+def write_missing_values_report(raw_df: pd.DataFrame, cleaned_df: pd.DataFrame, report_path=REPORT_PATH):
+    """Plot the missing values of the raw and the cleaned dataset into `report_path`."""
+    os.makedirs(report_path, exist_ok=True)
+    visualize_missing_values(raw_df, "Missing Before", os.path.join(report_path, "missing_before.png"))
+    visualize_missing_values(cleaned_df, "Missing After", os.path.join(report_path, "missing_after.png"))
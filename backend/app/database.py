@@ -2,14 +2,16 @@ import os
 from typing import AsyncGenerator
 
 import dotenv
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 
 # Load environment variables from .env file
 dotenv.load_dotenv()
 
-# Database URL constructed using environment variables
-DATABASE_URL = (
+# Database URL constructed using environment variables; DATABASE_URL overrides it
+# (e.g. sqlite+aiosqlite:///gardener.db for local tests)
+DATABASE_URL = os.getenv("DATABASE_URL") or (
     f'postgresql+asyncpg://{os.getenv("DB_USER")}:{os.getenv("DB_PASSWORD")}@{os.getenv("DB_HOST")}:'
     f'{os.getenv("DB_PORT")}/{os.getenv("DB_DATABASE")}'
 )
@@ -25,3 +27,9 @@ async_session_maker = async_sessionmaker(engine, expire_on_commit=False, class_=
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
         yield session
+
+
+def insert_ignoring_conflicts(model):
+    """INSERT ... ON CONFLICT DO NOTHING statement for the dialect of the configured engine."""
+    dialect = sqlite if engine.dialect.name == "sqlite" else postgresql
+    return dialect.insert(model).on_conflict_do_nothing()
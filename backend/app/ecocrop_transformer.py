@@ -1,15 +1,18 @@
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
-import seaborn as sns
 
 from .field_parser import (
-    parse_list_column,
-    parse_categorical_with_notes,
-    get_full_category_description,
+    parse_list_series,
+    parse_categorical_with_notes_series,
+    get_full_category_description_series,
 )
+from .multi_hot import MULTI_HOT_PATH, encode_list_columns, save_encodings
+from .snapshot import SNAPSHOT_PATH, write_snapshot
 
 # Constants
 NUMERIC_FIELDS = [
@@ -31,22 +34,24 @@ CATEGORICAL_WITH_NOTES = [
     "PHOTO", "TEXT", "DRA", "SALR", "FER", "TOX", "DEPR"
 ]
 
+# Category list columns that are additionally multi-hot encoded
+MULTI_HOT_COLUMNS = [f"{col}_LIST" for col in LIST_COLUMNS + CATEGORICAL_WITH_NOTES]
+
+# Derived columns holding one Python list per cell
+PARSED_LIST_COLUMNS = (
+    [f"{col}_LIST" for col in LIST_COLUMNS + CATEGORICAL_WITH_NOTES] +
+    [f"{col}_DESC" for col in CATEGORICAL_WITH_NOTES]
+)
+
 RESOURCES_PATH = "resources"
-REPORT_PATH = os.path.join(RESOURCES_PATH, "data-report")
 INPUT_FILE = os.path.join(RESOURCES_PATH, "EcoCrop_DB.xlsx")
 
-def visualize_missing_values(df, title, filename):
-    na_counts = df.isna().sum()
-    empty_counts = (df == "").sum()
-    combined = na_counts + empty_counts
-    plt.figure(figsize=(15, 7))
-    sns.barplot(x=combined.index, y=combined.values, palette="viridis")
-    plt.xticks(rotation=90)
-    plt.title(title)
-    plt.ylabel("Missing / Empty Entries")
-    plt.tight_layout()
-    plt.savefig(filename)
-    plt.close()
+# Rows rendered per process pool task when exporting RAG documents
+RAG_EXPORT_CHUNK_SIZE = 256
+# "jsonl" or "parquet" to export the RAG documents as a single bundle instead of one file per plant
+RAG_BUNDLE_FORMAT = os.getenv("RAG_BUNDLE_FORMAT") or None
+# Render the missing value plots (needs matplotlib and seaborn)
+WRITE_DATA_REPORT = os.getenv("ECOCROP_DATA_REPORT", "").lower() in ("1", "true", "yes")
 
 def clean_and_prepare(df):
     # Replace weird placeholders with NaN
@@ -76,95 +81,94 @@ def clean_and_prepare(df):
 
 def parse_and_normalize(df):
     for col in LIST_COLUMNS:
-        df[f"{col}_LIST"] = df[col].apply(parse_list_column)
+        df[f"{col}_LIST"] = parse_list_series(df[col])
 
     for col in CATEGORICAL_WITH_NOTES:
         # Clean malformed brackets (e.g., "high (>10 dS/m))")
         df[col] = df[col].astype(str).str.replace("))", ")", regex=False)
-        df[f"{col}_LIST"] = df[col].apply(parse_categorical_with_notes)
-        df[f"{col}_DESC"] = df[col].apply(get_full_category_description)
+        df[f"{col}_LIST"] = parse_categorical_with_notes_series(df[col])
+        df[f"{col}_DESC"] = get_full_category_description_series(df[col])
 
     return df
 
 def standardize_nulls(df):
     for col in df.columns:
+        if col in PARSED_LIST_COLUMNS:
+            # Parsed category lists stay lists: the trait flags and RAG traits are computed from them.
+            # The parsers never return nulls.
+            continue
         if df[col].dtype == "object":
             df[col] = df[col].fillna("").astype(str)
         else:
             df[col] = df[col].where(pd.notnull(df[col]), None)
     return df
 
-def add_additional_features(df):
+def _range_width(df, upper, lower):
+    return df[upper].astype(float) - df[lower].astype(float)
+
+
+def add_additional_features(df, encodings=None):
+    """
+    Add the derived feature and score columns. List-based flags are computed on the multi-hot
+    encodings of the list columns, which are built here unless passed in.
+    """
+    if encodings is None:
+        encodings = encode_list_columns(df, MULTI_HOT_COLUMNS)
+
+    def as_column(values):
+        return pd.Series(values, index=df.index)
+
+    abitol, abisus, salr = encodings["ABITOL_LIST"], encodings["ABISUS_LIST"], encodings["SALR_LIST"]
+    photo, depr = encodings["PHOTO_LIST"], encodings["DEPR_LIST"]
+
     # Drought/fire/saline tolerance & susceptibility
-    df["IS_DROUGHT_TOLERANT"] = df["ABITOL_LIST"].apply(lambda x: "drought" in x if isinstance(x, list) else False)
-    df["IS_DROUGHT_SUSCEPTIBLE"] = df["ABISUS_LIST"].apply(lambda x: "drought" in x if isinstance(x, list) else False)
+    df["IS_DROUGHT_TOLERANT"] = as_column(abitol.contains("drought"))
+    df["IS_DROUGHT_SUSCEPTIBLE"] = as_column(abisus.contains("drought"))
 
-    df["IS_FIRE_TOLERANT"] = df["ABITOL_LIST"].apply(lambda x: "fire" in x if isinstance(x, list) else False)
-    df["IS_FIRE_SUSCEPTIBLE"] = df["ABISUS_LIST"].apply(lambda x: "fire" in x if isinstance(x, list) else False)
+    df["IS_FIRE_TOLERANT"] = as_column(abitol.contains("fire"))
+    df["IS_FIRE_SUSCEPTIBLE"] = as_column(abisus.contains("fire"))
 
-    df["IS_SALINE_TOLERANT"] = df["SALR_LIST"].apply(lambda x: "high" in x if isinstance(x, list) else False)
-    df["IS_SALINE_INTOLERANT"] = df["SALR_LIST"].apply(lambda x: "low" in x if isinstance(x, list) else False)
+    df["IS_SALINE_TOLERANT"] = as_column(salr.contains("high"))
+    df["IS_SALINE_INTOLERANT"] = as_column(salr.contains("low"))
 
     # Photoperiod flexibility
-    df["IS_MULTIPLE_PHOTO_PERIODS"] = df["PHOTO_LIST"].apply(
-        lambda x: len(set(x)) > 1 if isinstance(x, list) else False
-    )
+    df["IS_MULTIPLE_PHOTO_PERIODS"] = as_column(photo.distinct_count() > 1)
 
     # Soil texture tolerance
-    df["SOIL_TEXTURE_FLEXIBILITY_SCORE"] = df["TEXT_LIST"].apply(
-        lambda x: len(set(x)) if isinstance(x, list) else 0
-    )
+    df["SOIL_TEXTURE_FLEXIBILITY_SCORE"] = as_column(encodings["TEXT_LIST"].distinct_count())
     df["IS_SOIL_TEXTURE_TOLERANT"] = df["SOIL_TEXTURE_FLEXIBILITY_SCORE"] >= 3
 
+    # Temperature tolerance (comparisons with NaN are False)
+    df["IS_HIGH_TEMPERATURE_TOLERANT"] = df["TMAX"].astype(float) >= 40
     # Temperature tolerance
-    df["IS_HIGH_TEMPERATURE_TOLERANT"] = df["TMAX"].apply(lambda x: x >= 40 if pd.notna(x) else False)
-    # Temperature tolerance
-    df["IS_LOW_TEMPERATURE_TOLERANT"] = df["TMIN"].apply(lambda x: x <= 10 if pd.notna(x) else False)
+    df["IS_LOW_TEMPERATURE_TOLERANT"] = df["TMIN"].astype(float) <= 10
 
     # Growth cycle
     df["GROWTH_CYCLE_DAYS"] = df["GMAX"] - df["GMIN"]
     df["IS_FAST_CYCLE"] = df["GROWTH_CYCLE_DAYS"] <= 90
 
     # Precipitation range flexibility
-    df["PRECIP_RANGE_WIDTH"] = df.apply(
-        lambda row: float(row["RMAX"]) - float(row["RMIN"])
-        if pd.notna(row["RMAX"]) and pd.notna(row["RMIN"]) else None,
-        axis=1,
-    )
+    df["PRECIP_RANGE_WIDTH"] = _range_width(df, "RMAX", "RMIN")
     df["IS_WIDE_PRECIP_TOLERANCE"] = df["PRECIP_RANGE_WIDTH"] > 1500
 
     # PH range
-    df["PH_RANGE_WIDTH"] = df.apply(
-        lambda row: float(row["PHMAX"]) - float(row["PHMIN"])
-        if pd.notna(row["PHMAX"]) and pd.notna(row["PHMIN"]) else None,
-        axis=1,
-    )
+    df["PH_RANGE_WIDTH"] = _range_width(df, "PHMAX", "PHMIN")
     df["IS_PH_FLEXIBLE"] = df["PH_RANGE_WIDTH"] >= 2
 
-    df["TEMP_RANGE_WIDTH"] = df.apply(
-        lambda row: float(row["TMAX"]) - float(row["TMIN"])
-        if pd.notna(row["TMAX"]) and pd.notna(row["TMIN"]) else None,
-        axis=1,
-    )
+    df["TEMP_RANGE_WIDTH"] = _range_width(df, "TMAX", "TMIN")
     df["IS_TEMP_FLEXIBLE"] = df["TEMP_RANGE_WIDTH"] >= 20
 
     # Climate zones
-    df["CLIZ_ZONE_COUNT"] = df["CLIZ_LIST"].apply(lambda x: len(x) if isinstance(x, list) else 0)
+    df["CLIZ_ZONE_COUNT"] = as_column(encodings["CLIZ_LIST"].lengths)
 
     # Cultural familiarity
-    df["HAS_MULTIPLE_COMMON_NAMES"] = df["COMNAME_LIST"].apply(
-        lambda x: len(x) > 3 if isinstance(x, list) else False
-    )
+    df["HAS_MULTIPLE_COMMON_NAMES"] = as_column(encodings["COMNAME_LIST"].lengths > 3)
 
     # Root system depth
-    df["IS_SHALLOW_ROOTED"] = df["DEPR_LIST"].apply(
-        lambda x: any("shallow" in val for val in x) if isinstance(x, list) else False
-    )
+    df["IS_SHALLOW_ROOTED"] = as_column(depr.any_of(depr.terms_containing("shallow")))
 
     # Photoperiod indicator
-    df["IS_SHORT_DAY"] = df["PHOTO_LIST"].apply(
-        lambda x: "short day" in x if isinstance(x, list) else False
-    )
+    df["IS_SHORT_DAY"] = as_column(photo.contains("short day"))
 
     # --- Subscores ---
 
@@ -198,7 +202,7 @@ def add_additional_features(df):
             0.35 * df["SOIL_ADAPT_SCORE"] +
             0.25 * df["WATER_ADAPT_SCORE"]
     ).round(3)
-    df["ADAPTABILITY_LABEL"] = df["ADAPTABILITY_SCORE"].apply(score_to_label)
+    df["ADAPTABILITY_LABEL"] = scores_to_labels(df["ADAPTABILITY_SCORE"])
 
     return df
 
@@ -214,28 +218,52 @@ def score_to_label(score: float) -> str:
     else:
         return "Very Low"
 
-def transform_ecocrop_data():
-    os.makedirs(REPORT_PATH, exist_ok=True)
-    df = pd.read_excel(INPUT_FILE)
+def scores_to_labels(scores: pd.Series) -> pd.Series:
+    """Vectorized score_to_label."""
+    labels = np.select(
+        [scores.isna(), scores >= 0.8, scores >= 0.6, scores >= 0.4],
+        ["Unknown", "High", "Moderate", "Low"],
+        default="Very Low",
+    )
+    return pd.Series(labels, index=scores.index)
 
-    visualize_missing_values(df, "Missing Before", os.path.join(REPORT_PATH, "missing_before.png"))
+def transform_ecocrop_data(write_report=WRITE_DATA_REPORT):
+    raw_df = pd.read_excel(INPUT_FILE)
+    rows_before = len(raw_df)
 
-    df = clean_and_prepare(df)
+    # clean_and_prepare replaces placeholders in place, the report needs the untouched raw data
+    df = clean_and_prepare(raw_df.copy() if write_report else raw_df)
     df = parse_and_normalize(df)
     df = standardize_nulls(df)
 
-    visualize_missing_values(df, "Missing After", os.path.join(REPORT_PATH, "missing_after.png"))
+    if write_report:
+        from .data_report import write_missing_values_report
+        write_missing_values_report(raw_df, df)
+
+    encodings = encode_list_columns(df, MULTI_HOT_COLUMNS)
+    df = add_additional_features(df, encodings)
+    export_rag_chunks(df, bundle_format=RAG_BUNDLE_FORMAT)
 
-    df = add_additional_features(df)
-    export_rag_chunks(df)
+    save_encodings(MULTI_HOT_PATH, encodings, df["EcoPortCode"])
 
+    manifest = write_snapshot(df, SNAPSHOT_PATH)
 
-    df.to_excel(os.path.join(RESOURCES_PATH, "Cleaned_EcoCrop_DB_Final.xlsx"), index=False)
-    df.to_csv(os.path.join(RESOURCES_PATH, "cleaned_ecocrop.csv"), index=False)
-    df.to_json(os.path.join(RESOURCES_PATH, "cleaned_ecocrop.json"), orient="records", indent=2)
-    print("Rows before clean:", len(pd.read_excel(INPUT_FILE)))
+    # Excel cannot hold list cells, the text exports keep their string representation
+    flat_df = stringify_list_columns(df)
+    flat_df.to_excel(os.path.join(RESOURCES_PATH, "Cleaned_EcoCrop_DB_Final.xlsx"), index=False)
+    flat_df.to_csv(os.path.join(RESOURCES_PATH, "cleaned_ecocrop.csv"), index=False)
+    flat_df.to_json(os.path.join(RESOURCES_PATH, "cleaned_ecocrop.json"), orient="records", indent=2)
+    print("Rows before clean:", rows_before)
     print("Rows after clean:", len(df))
-    print("✅ Exported cleaned data to .xlsx, .csv, and .json")
+    print(f"✅ Exported cleaned data to .arrow (snapshot v{manifest['version']}), .npz (multi-hot), .xlsx, .csv, and .json")
+
+
+def stringify_list_columns(df):
+    df = df.copy()
+    for col in PARSED_LIST_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype(str)
+    return df
 
 
 
@@ -338,16 +366,75 @@ def generate_rag_document(row):
     if isinstance(growth_days, (int, float)):
         lines.append(f"🕒 Growth cycle: {int(growth_days)} days")
 
+    if isinstance(photo_desc, list):
+        photo_desc = ", ".join(photo_desc)
     if photo_desc.strip():
         lines.append(f"🌞 Photoperiod: {photo_desc}")
 
     return "\n".join(lines)
 
-def export_rag_chunks(df, output_dir=os.path.join(RESOURCES_PATH,"rag_chunks")):
-    Path(output_dir).mkdir(exist_ok=True)
-    for _, row in df.iterrows():
-        doc = generate_rag_document(row)
-        Path(output_dir, f"{row['EcoPortCode']}.txt").write_text(doc)
+def _render_rag_documents(records):
+    """Worker of export_rag_chunks: (EcoPortCode, ScientificName, document) for a chunk of row records."""
+    return [(record["EcoPortCode"], record["ScientificName"], generate_rag_document(record)) for record in records]
+
+
+def _write_if_changed(path: Path, content: str) -> bool:
+    """Write `content` unless the file already holds exactly that; returns whether it was written."""
+    try:
+        if path.read_text(encoding="utf-8") == content:
+            return False
+    except (OSError, UnicodeDecodeError):
+        pass
+    path.write_text(content, encoding="utf-8")
+    return True
+
+
+def _write_rag_bundle(documents, output_dir, bundle_format) -> bool:
+    rows = [{"EcoPortCode": code, "ScientificName": name, "text": doc} for code, name, doc in documents]
+    path = Path(output_dir, f"rag_chunks.{bundle_format}")
+    if bundle_format == "jsonl":
+        content = "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+        return _write_if_changed(path, content)
+    bundle = pd.DataFrame(rows, columns=["EcoPortCode", "ScientificName", "text"])
+    if path.exists():
+        try:
+            if pd.read_parquet(path).equals(bundle):
+                return False
+        except (OSError, ValueError):
+            pass
+    bundle.to_parquet(path, index=False)
+    return True
+
+
+def export_rag_chunks(df, output_dir=os.path.join(RESOURCES_PATH,"rag_chunks"), bundle_format=None, workers=None):
+    """
+    Write one RAG document per plant. Documents are rendered in row chunks on a process pool,
+    and files whose content did not change are not rewritten.
+
+    With `bundle_format` "jsonl" or "parquet", all documents are written to a single
+    rag_chunks.<format> file in `output_dir` instead of one .txt file per plant.
+    """
+    if bundle_format not in (None, "jsonl", "parquet"):
+        raise ValueError(f"Unknown RAG bundle format: {bundle_format}")
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+    records = df.to_dict("records")
+    chunks = [records[i:i + RAG_EXPORT_CHUNK_SIZE] for i in range(0, len(records), RAG_EXPORT_CHUNK_SIZE)]
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            rendered = list(executor.map(_render_rag_documents, chunks))
+    else:
+        rendered = [_render_rag_documents(chunk) for chunk in chunks]
+    documents = [document for chunk in rendered for document in chunk]
+
+    if bundle_format is not None:
+        written = _write_rag_bundle(documents, output_dir, bundle_format)
+        print(f"📦 RAG bundle rag_chunks.{bundle_format} {'written' if written else 'unchanged'}")
+        return
+
+    written = sum(_write_if_changed(Path(output_dir, f"{code}.txt"), doc) for code, _, doc in documents)
+    print(f"📝 RAG chunks: {written} written, {len(documents) - written} unchanged")
 
 
 if __name__ == "__main__":
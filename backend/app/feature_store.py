@@ -0,0 +1,107 @@
+import functools
+import os
+import threading
+import time
+
+from fastapi import HTTPException
+
+from .logger import logger
+
+FEAST_REPO_PATH = "feature_repo"
+# After a failure the store is not contacted again for this many seconds; requests fail fast meanwhile
+FEATURE_STORE_RETRY_SECONDS = float(os.getenv("FEATURE_STORE_RETRY_SECONDS", 30))
+
+
+@functools.cache
+def backend_errors() -> tuple:
+    """
+    Exception types raised when the vector backend itself fails: connection problems with the online
+    store (Milvus) or the registry (Postgres), and Feast's own errors. Anything else is a bug or bad
+    input and must not be mistaken for an outage.
+    """
+    errors = [OSError]
+    try:
+        from feast.errors import FeastError
+        errors.append(FeastError)
+    except ImportError:
+        pass
+    try:
+        from pymilvus.exceptions import MilvusException
+        errors.append(MilvusException)
+    except ImportError:
+        pass
+    try:
+        from sqlalchemy.exc import OperationalError
+        errors.append(OperationalError)
+    except ImportError:
+        pass
+    return tuple(errors)
+
+
+class FeatureStoreHandle:
+    """
+    Lazily created Feast FeatureStore shared by all RAG requests of a worker.
+
+    Neither feast nor the feature repository registry are loaded before the first RAG request, so the
+    rest of the backend starts (and keeps working) without them. If creating the store or a retrieval
+    fails, the handle drops the store and reports it unavailable for FEATURE_STORE_RETRY_SECONDS
+    before trying again. Methods block and are meant to run in the threadpool.
+    """
+
+    def __init__(self, repo_path=FEAST_REPO_PATH, retry_seconds=FEATURE_STORE_RETRY_SECONDS):
+        self.repo_path = repo_path
+        self.retry_seconds = retry_seconds
+        self._store = None
+        # Reentrant: get() marks the store unhealthy while holding it
+        self._lock = threading.RLock()
+        self._failed_at = None
+        self.last_error = None
+
+    def _unavailable(self) -> HTTPException:
+        return HTTPException(status_code=503, detail=f"Feature store unavailable: {self.last_error}")
+
+    def get(self):
+        """The shared store, created on first use. Raises a 503 HTTPException while the store is unavailable."""
+        store = self._store
+        if store is not None:
+            return store
+        with self._lock:
+            if self._store is None:
+                if self._failed_at is not None and time.monotonic() - self._failed_at < self.retry_seconds:
+                    raise self._unavailable()
+                try:
+                    from feast import FeatureStore
+                    self._store = FeatureStore(repo_path=self.repo_path)
+                except Exception as e:
+                    self.mark_unhealthy(e)
+                    raise self._unavailable() from e
+                self._failed_at = None
+                self.last_error = None
+                logger.info(f"Feature store initialized from {self.repo_path}")
+            return self._store
+
+    def mark_unhealthy(self, error):
+        """Drop the store after a failed call; it is recreated once the retry interval has passed."""
+        logger.warning(f"Feature store marked unavailable: {error!r}")
+        with self._lock:
+            self._store = None
+            self._failed_at = time.monotonic()
+            self.last_error = repr(error)
+
+    def check(self) -> dict:
+        """Create the store if needed and report its state."""
+        try:
+            self.get()
+        except HTTPException:
+            pass
+        return self.status()
+
+    def status(self) -> dict:
+        return {
+            "initialized": self._store is not None,
+            "available": self._failed_at is None or time.monotonic() - self._failed_at >= self.retry_seconds,
+            "last_error": self.last_error,
+        }
+
+
+feature_store = FeatureStoreHandle()
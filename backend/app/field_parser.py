@@ -1,12 +1,19 @@
+import numpy as np
 import pandas as pd
 import re
 import unicodedata
 
+# Leading category label of a segment, e.g. "well" in "well (dry spells)"
+CATEGORY_PATTERN = re.compile(r"([a-z\s/+-]+)")
+
 
 def normalize_unicode(text: str) -> str:
     """Normalize broken Unicode characters to ASCII (e.g., from Excel or inconsistent encodings)."""
     if pd.isna(text):
         return ""
+    if text.isascii():
+        # NFKD leaves ASCII unchanged
+        return text
     return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
 
 
@@ -30,7 +37,7 @@ def parse_categorical_with_notes(value: str) -> list[str]:
     categories = []
     for p in value.split(","):
         p = p.strip().lower()
-        match = re.match(r"([a-z\s/+-]+)", p)
+        match = CATEGORY_PATTERN.match(p)
         if match:
             clean = match.group(1).strip()
             if clean:
@@ -46,3 +53,32 @@ def get_full_category_description(value: str) -> list[str]:
     if pd.isna(value) or value.strip() == "":
         return []
     return [p.strip() for p in value.split(",") if p.strip()]
+
+
+def _parse_column(series: pd.Series, parser) -> pd.Series:
+    """
+    Apply a cell parser to a whole column, parsing every distinct raw value only once.
+    Many cells repeat verbatim; each cell still gets its own list.
+    """
+    codes, uniques = pd.factorize(series.to_numpy(dtype=object), use_na_sentinel=True)
+    parsed = [parser(value) for value in uniques]
+    empty = parser(np.nan)
+    return pd.Series(
+        [list(parsed[code]) if code >= 0 else list(empty) for code in codes],
+        index=series.index, dtype=object,
+    )
+
+
+def parse_list_series(series: pd.Series) -> pd.Series:
+    """Column-level parse_list_column."""
+    return _parse_column(series, parse_list_column)
+
+
+def parse_categorical_with_notes_series(series: pd.Series) -> pd.Series:
+    """Column-level parse_categorical_with_notes."""
+    return _parse_column(series, parse_categorical_with_notes)
+
+
+def get_full_category_description_series(series: pd.Series) -> pd.Series:
+    """Column-level get_full_category_description."""
+    return _parse_column(series, get_full_category_description)
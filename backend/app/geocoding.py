@@ -0,0 +1,130 @@
+import csv
+import os
+import re
+import unicodedata
+from collections import OrderedDict
+
+import httpx
+from fastapi import HTTPException
+
+from .database import async_session_maker, insert_ignoring_conflicts
+from .http_client import http_client
+from .logger import logger
+from .models import GeocodeCacheEntry
+
+GEOCODE_URL = "https://geocode.xyz/{location}?json=1"
+GEOCODE_CACHE_MAX_ENTRIES = int(os.getenv("GEOCODE_CACHE_MAX_ENTRIES", 10000))
+# Optional CSV file with name,latitude,longitude rows resolved without any network hop
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", os.path.join("resources", "gazetteer.csv"))
+
+
+def normalize_location_query(location: str) -> str:
+    """
+    Normalize a free-text location so that trivially different spellings share a cache entry.
+    E.g., "  Hamburg ,Germany " → "hamburg, germany"
+    """
+    location = unicodedata.normalize("NFKC", location).casefold()
+    location = re.sub(r"\s*,\s*", ", ", location)
+    location = re.sub(r"\s+", " ", location)
+    return location.strip(" ,")
+
+
+class Geocoder:
+    """
+    Resolves location strings to coordinates through a chain of increasingly expensive lookups:
+    in-memory LRU → offline gazetteer → persistent geocode_cache table → geocode.xyz.
+    Every successful lookup from a slower layer is written back to the faster ones.
+    """
+
+    def __init__(self, max_entries=GEOCODE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._gazetteer = {}
+        self.memory_hits = 0
+        self.gazetteer_hits = 0
+        self.database_hits = 0
+        self.upstream_lookups = 0
+
+    def load_gazetteer(self, path=GAZETTEER_PATH):
+        """Load the offline gazetteer if the file exists. Returns the number of loaded names."""
+        if not path or not os.path.exists(path):
+            return 0
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                self._gazetteer[normalize_location_query(row["name"])] = (
+                    float(row["latitude"]), float(row["longitude"])
+                )
+        logger.info(f"Loaded {len(self._gazetteer)} gazetteer entries from {path}")
+        return len(self._gazetteer)
+
+    def _remember(self, query, coordinates):
+        self._memory[query] = coordinates
+        self._memory.move_to_end(query)
+        if len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def geocode(self, location):
+        """Return (latitude, longitude) for a location string; tuples are returned unchanged."""
+        if isinstance(location, tuple):
+            latitude, longitude = location
+            return latitude, longitude
+
+        query = normalize_location_query(location)
+
+        coordinates = self._memory.get(query)
+        if coordinates is not None:
+            self.memory_hits += 1
+            self._memory.move_to_end(query)
+            return coordinates
+
+        coordinates = self._gazetteer.get(query)
+        if coordinates is not None:
+            self.gazetteer_hits += 1
+            self._remember(query, coordinates)
+            return coordinates
+
+        async with async_session_maker() as session:
+            entry = await session.get(GeocodeCacheEntry, query)
+        if entry is not None:
+            self.database_hits += 1
+            coordinates = (entry.latitude, entry.longitude)
+            self._remember(query, coordinates)
+            return coordinates
+
+        self.upstream_lookups += 1
+        coordinates = await self._request_coordinates(location)
+
+        async with async_session_maker() as session:
+            await session.execute(
+                insert_ignoring_conflicts(GeocodeCacheEntry)
+                .values(query=query, latitude=coordinates[0], longitude=coordinates[1])
+            )
+            await session.commit()
+
+        self._remember(query, coordinates)
+        return coordinates
+
+    @staticmethod
+    async def _request_coordinates(location):
+        try:
+            geocode_response = await http_client.get(GEOCODE_URL.format(location=location))
+            geocode_data = geocode_response.json()
+            return float(geocode_data['latt']), float(geocode_data['longt'])
+        except (httpx.HTTPError, ValueError, KeyError, TypeError) as e:
+            # Throttled or unknown locations are not cached so that they are retried next time
+            logger.error(f"Failed to geocode location '{location}': {e!r}")
+            raise HTTPException(status_code=500, detail=f"Failed to geocode location: {location}")
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "gazetteer_entries": len(self._gazetteer),
+            "memory_hits": self.memory_hits,
+            "gazetteer_hits": self.gazetteer_hits,
+            "database_hits": self.database_hits,
+            "upstream_lookups": self.upstream_lookups,
+        }
+
+
+geocoder = Geocoder()
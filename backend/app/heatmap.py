@@ -0,0 +1,158 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import math
+import os
+import shutil
+
+import numpy as np
+from fastapi import HTTPException
+
+from .logger import logger
+from .models import PlantModel
+from .suitability import request_daily_weather_batch, suitability_tables
+from .weather_cache import weather_cache
+
+HEATMAP_CACHE_DIR = os.getenv("HEATMAP_CACHE_DIR", os.path.join("resources", "heatmap_cache"))
+HEATMAP_MAX_CELLS = int(os.getenv("HEATMAP_MAX_CELLS", 10000))
+# Coordinates per open-meteo multi-location request, and such requests in flight per heatmap
+WEATHER_BATCH_SIZE = 100
+WEATHER_BATCH_CONCURRENCY = 4
+# Cell value for cells without a score (weather unavailable)
+NODATA = 255
+
+
+def heatmap_grid(min_lat, min_lon, max_lat, max_lon, resolution):
+    """
+    Cell centre latitudes (north to south) and longitudes (west to east) of a bounding box.
+    Raises a 400 HTTPException if the box is empty or has more than HEATMAP_MAX_CELLS cells.
+    """
+    if min_lat >= max_lat or min_lon >= max_lon:
+        raise HTTPException(status_code=400, detail="The bounding box must have min < max for both axes")
+    rows = math.ceil(round((max_lat - min_lat) / resolution, 9))
+    cols = math.ceil(round((max_lon - min_lon) / resolution, 9))
+    if rows * cols > HEATMAP_MAX_CELLS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{rows * cols} cells requested, at most {HEATMAP_MAX_CELLS}; use a coarser resolution",
+        )
+    latitudes = np.round(max_lat - (np.arange(rows) + 0.5) * resolution, 6)
+    longitudes = np.round(min_lon + (np.arange(cols) + 0.5) * resolution, 6)
+    return latitudes, longitudes
+
+
+def latitude_mask(plant: PlantModel, latitudes) -> np.ndarray:
+    """
+    Rows inside the plant's absolute latitude limits. EcoCrop gives LATMN as the southern and LATMX as
+    the northern limit in degrees from the equator; missing limits do not restrict the range.
+    """
+    south = -plant.LATMN if plant.LATMN is not None else -90.0
+    north = plant.LATMX if plant.LATMX is not None else 90.0
+    return (latitudes >= south) & (latitudes <= north)
+
+
+def _cache_day_dir():
+    """Heatmaps are only valid for the forecast day; each day gets its own subdirectory."""
+    return os.path.join(HEATMAP_CACHE_DIR, datetime.date.today().isoformat())
+
+
+def _cache_path(plant: PlantModel, bbox, resolution):
+    parameters = [
+        plant.EcoPortCode,
+        [getattr(plant, field) for field in ("TOPMN", "TOPMX", "TMIN", "TMAX", "ROPMN", "ROPMX", "RMIN", "RMAX",
+                                             "LATMN", "LATMX")],
+        list(bbox), resolution,
+    ]
+    key = hashlib.sha256(json.dumps(parameters).encode()).hexdigest()
+    return os.path.join(_cache_day_dir(), f"{key}.npy")
+
+
+def _write_cache(path, scores):
+    day_dir = os.path.dirname(path)
+    os.makedirs(day_dir, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+    np.save(tmp_path, scores)
+    os.replace(tmp_path, path)
+    # Heatmaps of earlier forecast days (and files of the old flat layout) are never served again
+    for name in os.listdir(HEATMAP_CACHE_DIR):
+        stale = os.path.join(HEATMAP_CACHE_DIR, name)
+        if stale == day_dir:
+            continue
+        if os.path.isdir(stale):
+            shutil.rmtree(stale, ignore_errors=True)
+        else:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+
+async def _fetch_weather(cells):
+    """Daily weather per grid-snapped (latitude, longitude) cell; cells whose batch fails map to None."""
+    weather = {}
+    missing = []
+    for cell in cells:
+        cached = weather_cache.peek(*cell)
+        if cached is not None:
+            weather[cell] = cached
+        else:
+            missing.append(cell)
+
+    semaphore = asyncio.Semaphore(WEATHER_BATCH_CONCURRENCY)
+
+    async def fetch_batch(batch):
+        async with semaphore:
+            try:
+                series = await request_daily_weather_batch(batch)
+            except HTTPException:
+                series = []
+        for cell, daily_weather in zip(batch, series):
+            weather[cell] = daily_weather
+            if daily_weather is not None:
+                weather_cache.put(*cell, daily_weather)
+
+    await asyncio.gather(*(
+        fetch_batch(missing[start:start + WEATHER_BATCH_SIZE])
+        for start in range(0, len(missing), WEATHER_BATCH_SIZE)
+    ))
+    return weather
+
+
+async def compute_heatmap(plant: PlantModel, min_lat, min_lon, max_lat, max_lon, resolution) -> np.ndarray:
+    """
+    Suitability score (0-100) of a plant for every cell of a bounding box, as a uint8 array with one row
+    per latitude (north first). Cells outside the plant's latitude limits score 0 without fetching
+    weather; cells without weather data are NODATA.
+
+    Cells sharing a forecast grid cell share one weather fetch; missing forecasts are fetched with
+    batched multi-coordinate requests. Complete heatmaps are cached on disk for the forecast day.
+    """
+    latitudes, longitudes = heatmap_grid(min_lat, min_lon, max_lat, max_lon, resolution)
+    path = _cache_path(plant, (min_lat, min_lon, max_lat, max_lon), resolution)
+    if os.path.exists(path):
+        return np.load(path)
+
+    scores = np.zeros((len(latitudes), len(longitudes)), dtype=np.uint8)
+    rows = np.flatnonzero(latitude_mask(plant, latitudes))
+
+    # Forecast grid cell of every remaining heatmap cell
+    cell_of = {}
+    for row in rows:
+        for col, longitude in enumerate(longitudes):
+            cell_of[(row, col)] = weather_cache.key(latitudes[row], longitude)[:2]
+    weather = await _fetch_weather(list(dict.fromkeys(cell_of.values())))
+
+    table = suitability_tables.get(plant)
+    cell_scores = {
+        cell: table.score(daily_weather) if daily_weather is not None else NODATA
+        for cell, daily_weather in weather.items()
+    }
+    for (row, col), cell in cell_of.items():
+        scores[row, col] = cell_scores.get(cell, NODATA)
+
+    if NODATA in cell_scores.values() or len(cell_scores) < len(set(cell_of.values())):
+        logger.warning(f"Heatmap for {plant.ScientificName} is incomplete, not caching it")
+    else:
+        _write_cache(path, scores)
+    return scores
@@ -0,0 +1,129 @@
+import asyncio
+import os
+import random
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+import httpx
+
+from .logger import logger
+
+# Connection pool shared by all outbound calls of a worker
+MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+# Upper bound of concurrent requests against a single upstream host
+PER_HOST_CONCURRENCY = int(os.getenv("HTTP_PER_HOST_CONCURRENCY", 10))
+
+REQUEST_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 15.0))
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5.0))
+
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", 3))
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 8.0
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class AsyncHttpClient:
+    """
+    Pooled async HTTP client for all outbound calls of the backend.
+
+    All requests share one httpx connection pool. Each upstream host gets a concurrency limit,
+    so a slow upstream cannot use up the whole pool. Transient failures are retried with
+    exponential backoff. Identical GET requests that are in flight at the same time share a
+    single upstream call.
+    """
+
+    def __init__(self):
+        self._client = None
+        self._host_limits = {}
+        self._in_flight = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                ),
+                follow_redirects=True,
+            )
+        return self._client
+
+    def _host_limit(self, url) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(PER_HOST_CONCURRENCY)
+        return self._host_limits[host]
+
+    @staticmethod
+    def _backoff_delay(attempt, response=None) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), BACKOFF_MAX_SECONDS)
+        delay = BACKOFF_BASE_SECONDS * (2 ** attempt)
+        return min(delay, BACKOFF_MAX_SECONDS) * random.uniform(0.5, 1.0)
+
+    async def request(self, method, url, **kwargs) -> httpx.Response:
+        """
+        Send a request with per-host concurrency limiting and retry with backoff.
+        Returns the last response (which may have an error status) once retries are exhausted;
+        transport errors of the final attempt are raised.
+        """
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                async with self._host_limit(url):
+                    response = await self.client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                delay = self._backoff_delay(attempt)
+                logger.warning(f"{method} {url} failed ({e!r}), retrying in {delay:.2f}s")
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or attempt == MAX_RETRIES:
+                    return response
+                delay = self._backoff_delay(attempt, response)
+                logger.warning(f"{method} {url} returned {response.status_code}, retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    async def get(self, url, **kwargs) -> httpx.Response:
+        """GET a URL; concurrent calls for the same URL are coalesced into one upstream request."""
+        if kwargs:
+            return await self.request("GET", url, **kwargs)
+
+        task = self._in_flight.get(url)
+        if task is None:
+            task = asyncio.create_task(self.request("GET", url))
+            self._in_flight[url] = task
+            task.add_done_callback(lambda done: self._finish_in_flight(url, done))
+        # The upstream request belongs to no single caller: cancelling one of them leaves it running for the rest
+        return await asyncio.shield(task)
+
+    def _finish_in_flight(self, url, task):
+        if self._in_flight.get(url) is task:
+            del self._in_flight[url]
+        if not task.cancelled():
+            # Mark the exception as retrieved in case every caller has given up
+            task.exception()
+
+    async def post(self, url, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method, url, **kwargs):
+        """
+        Send a request and yield the response before its body is read, for streamed responses.
+        The request holds a slot of the host's concurrency limit until the block exits and is not retried.
+        """
+        async with self._host_limit(url):
+            async with self.client.stream(method, url, **kwargs) as response:
+                yield response
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+http_client = AsyncHttpClient()
@@ -1,8 +1,8 @@
-from typing import Optional, List
+from typing import Dict, Optional, List
 
-from sqlalchemy import Column, Integer, String, Float
+from sqlalchemy import Column, Integer, String, Float, DateTime, func
 from sqlalchemy.orm import declarative_base
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 Base = declarative_base()
 
@@ -164,6 +164,20 @@ class Plant(Base):
     PROSY = Column(String, nullable=True)
 
 
+class GeocodeCacheEntry(Base):
+    __tablename__ = "geocode_cache"
+
+    # Normalized location query, see geocoding.normalize_location_query
+    query = Column(String, primary_key=True)
+
+    latitude = Column(Float, nullable=False)
+
+    longitude = Column(Float, nullable=False)
+
+    # When the location was resolved by the upstream geocoding service.
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
 class PlantModel(BaseModel):
     EcoPortCode: int
     ScientificName: str
@@ -241,3 +255,56 @@ class PlantSuitabilityResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class PlantRanking(BaseModel):
+    EcoPortCode: int
+    ScientificName: str
+    suitability_score: float
+
+
+class PlantRankingResponse(BaseModel):
+    location: str
+    latitude: float
+    longitude: float
+    interval_used: int
+    rankings: List[PlantRanking]
+
+
+class PlantSuggestion(BaseModel):
+    EcoPortCode: int
+    ScientificName: str
+    # The completed name and the field it comes from (ScientificName, COMNAME or SYNO)
+    match: str
+    field: str
+
+
+# Upper bounds of a single batch suitability request
+SUITABILITY_BATCH_MAX_PLANTS = 5000
+SUITABILITY_BATCH_MAX_LOCATIONS = 200
+
+
+class SuitabilityBatchRequest(BaseModel):
+    scientific_names: List[str] = Field(min_length=1, max_length=SUITABILITY_BATCH_MAX_PLANTS)
+    locations: List[str] = Field(min_length=1, max_length=SUITABILITY_BATCH_MAX_LOCATIONS)
+
+
+class SuitabilityBatchResult(BaseModel):
+    location: str
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    interval_used: Optional[int] = None
+    scores: List[PlantRanking] = []
+    # Set instead of the scores if the location could not be geocoded or its weather fetched
+    error: Optional[str] = None
+
+
+class RagFilters(BaseModel):
+    """Metadata predicates restricting RAG retrieval to matching plants; all given predicates must hold."""
+    # Derived feature flag -> required value, e.g. {"IS_DROUGHT_TOLERANT": true, "IS_FAST_CYCLE": true}
+    flags: Dict[str, bool] = {}
+    min_adaptability_score: Optional[float] = None
+    max_adaptability_score: Optional[float] = None
+    # List column -> categories, e.g. {"CLIZ_LIST": ["tropical wet & dry"]}
+    any_of: Dict[str, List[str]] = {}
+    all_of: Dict[str, List[str]] = {}
@@ -0,0 +1,119 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Encodings of the cleaned dataset's category list columns, written by the transformer
+MULTI_HOT_PATH = os.path.join("resources", "cleaned_ecocrop_multi_hot.npz")
+
+
+class MultiHotColumn:
+    """
+    Compact multi-hot encoding of a column of category lists.
+
+    `vocabulary` holds the distinct categories in sorted order and `bits` one bit-packed row per cell:
+    bit j of row i is set if cell i contains vocabulary[j]. `lengths` keeps the original list lengths
+    (duplicates included). Cells that are not lists encode as empty.
+    """
+
+    def __init__(self, vocabulary, bits, lengths):
+        self.vocabulary = list(vocabulary)
+        self._positions = {term: position for position, term in enumerate(self.vocabulary)}
+        self.bits = bits
+        self.lengths = lengths
+
+    @classmethod
+    def from_lists(cls, cells) -> "MultiHotColumn":
+        cells = [cell if isinstance(cell, list) else [] for cell in cells]
+        vocabulary = sorted({term for cell in cells for term in cell})
+        positions = {term: position for position, term in enumerate(vocabulary)}
+
+        rows = np.repeat(np.arange(len(cells)), [len(cell) for cell in cells])
+        columns = np.fromiter((positions[term] for cell in cells for term in cell), dtype=np.int64, count=len(rows))
+        # Set the bits directly in packed form (most significant bit first, like np.packbits)
+        bits = np.zeros((len(cells), (len(vocabulary) + 7) // 8), dtype=np.uint8)
+        np.bitwise_or.at(bits, (rows, columns >> 3), (128 >> (columns & 7)).astype(np.uint8))
+        lengths = np.fromiter((len(cell) for cell in cells), dtype=np.int64, count=len(cells))
+        return cls(vocabulary, bits, lengths)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def _mask(self, terms) -> np.ndarray:
+        """Packed bit mask of the given terms; unknown terms are ignored."""
+        dense = np.zeros(self.bits.shape[1] * 8, dtype=bool)
+        dense[[self._positions[term] for term in terms if term in self._positions]] = True
+        return np.packbits(dense)
+
+    def contains(self, term) -> np.ndarray:
+        """Boolean array: does the cell contain `term`."""
+        return self.any_of([term])
+
+    def any_of(self, terms) -> np.ndarray:
+        """Boolean array: does the cell contain at least one of `terms`."""
+        return (self.bits & self._mask(terms)).any(axis=1)
+
+    def all_of(self, terms) -> np.ndarray:
+        """Boolean array: does the cell contain every one of `terms`."""
+        terms = list(terms)
+        if any(term not in self._positions for term in terms):
+            return np.zeros(len(self), dtype=bool)
+        mask = self._mask(terms)
+        return ((self.bits & mask) == mask).all(axis=1)
+
+    def terms_containing(self, substring) -> list:
+        """Vocabulary terms that contain `substring`, e.g. all "shallow ..." soil depths."""
+        return [term for term in self.vocabulary if substring in term]
+
+    def distinct_count(self) -> np.ndarray:
+        """Number of distinct categories per cell."""
+        return np.unpackbits(self.bits, axis=1).sum(axis=1, dtype=np.int64)
+
+    def term_counts(self) -> pd.Series:
+        """Number of cells containing each vocabulary term."""
+        counts = np.unpackbits(self.bits, axis=1)[:, :len(self.vocabulary)].sum(axis=0, dtype=np.int64)
+        return pd.Series(counts, index=self.vocabulary)
+
+    def filter(self, any_of=None, all_of=None, none_of=None) -> np.ndarray:
+        """Boolean row mask combining the given membership conditions."""
+        mask = np.ones(len(self), dtype=bool)
+        if any_of:
+            mask &= self.any_of(any_of)
+        if all_of:
+            mask &= self.all_of(all_of)
+        if none_of:
+            mask &= ~self.any_of(none_of)
+        return mask
+
+    def to_lists(self) -> list:
+        """Decode to sorted, de-duplicated category lists."""
+        dense = np.unpackbits(self.bits, axis=1)[:, :len(self.vocabulary)].astype(bool)
+        return [[self.vocabulary[j] for j in np.flatnonzero(row)] for row in dense]
+
+
+def encode_list_columns(df: pd.DataFrame, columns) -> dict:
+    """Multi-hot encode the given list columns of a DataFrame, keyed by column name."""
+    return {column: MultiHotColumn.from_lists(df[column]) for column in columns if column in df.columns}
+
+
+def save_encodings(path, encodings: dict, eco_port_codes):
+    """Store encodings in one .npz file, rows aligned with `eco_port_codes`."""
+    arrays = {"EcoPortCode": np.asarray(eco_port_codes, dtype=np.int64)}
+    for column, encoding in encodings.items():
+        arrays[f"{column}.vocabulary"] = np.asarray(encoding.vocabulary, dtype=str)
+        arrays[f"{column}.bits"] = encoding.bits
+        arrays[f"{column}.lengths"] = encoding.lengths
+    np.savez_compressed(path, **arrays)
+
+
+def load_encodings(path):
+    """Inverse of save_encodings: returns (eco_port_codes, {column: MultiHotColumn})."""
+    with np.load(path) as data:
+        columns = [name[:-len(".bits")] for name in data.files if name.endswith(".bits")]
+        encodings = {
+            column: MultiHotColumn(
+                data[f"{column}.vocabulary"].tolist(), data[f"{column}.bits"], data[f"{column}.lengths"]
+            )
+            for column in columns
+        }
+        return data["EcoPortCode"], encodings
@@ -1,71 +1,127 @@
-import math
+import base64
+import hashlib
+import json
+from typing import Optional
 
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, status
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from starlette.responses import Response
+from starlette.responses import Response, StreamingResponse
 
+from .autocomplete import autocomplete_index
+from .catalog import catalog
 from .database import get_async_session
-from .models import Plant, PlantModel, PlantSuitabilityResponse
-from .suitability import get_weather_and_suitability
+from .heatmap import compute_heatmap, NODATA
+from .models import (
+    Plant, PlantModel, PlantSuitabilityResponse, PlantRankingResponse, PlantSuggestion,
+    SuitabilityBatchRequest,
+)
+from .search import search_plant_codes, SEARCH_FIELDS, COMMON_NAME_FIELDS
+from .suitability import (
+    get_weather_and_suitability, geocode_location, fetch_daily_weather, iter_batch_suitability,
+    get_plant_data_by_scientific_name,
+)
+from .tolerance_matrix import get_tolerance_matrix
 
+# Number of plants serialized per chunk of a streamed NDJSON export
+NDJSON_CHUNK_SIZE = 500
 
-def _replace_nan_with_none(plant):
-    """
-    Replace NaN values with None for a Plant object.
+SEARCH_DEFAULT_LIMIT = 50
+SEARCH_MAX_LIMIT = 500
 
-    This function iterates over all attributes of a Plant object. If a float
-    attribute is NaN, it replaces the value with None.
+AUTOCOMPLETE_DEFAULT_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 100
 
-    :param plant: The Plant object to process.
-    :return: The processed Plant object with NaN values replaced by None.
-    """
-    for field, value in plant.__dict__.items():
-        if isinstance(value, float) and math.isnan(value):
-            setattr(plant, field, None)
-    return plant
+
+def _json_response(codes) -> Response:
+    return Response(content=catalog.json_array(codes), media_type="application/json")
 
 
 def get_plant_router() -> APIRouter:
     router = APIRouter()
 
     @router.get("/", response_model=list[PlantModel])
-    async def get_all_plants(session: AsyncSession = Depends(get_async_session)):
+    async def get_all_plants(
+            request: Request,
+            after: Optional[int] = None,
+            limit: Optional[int] = Query(None, ge=1),
+            fields: Optional[str] = None,
+            output_format: str = Query("json", alias="format", pattern="^(json|ndjson)$"),
+    ):
         """
             Retrieve all plants from the database.
 
-            This endpoint retrieves all plant records from the database. If no plants are found,
-            a 404 error is returned.
+            This endpoint retrieves plant records ordered by EcoPortCode. Results can be paginated with a
+            keyset cursor, restricted to a subset of fields and streamed as newline-delimited JSON for
+            full exports. Responses carry an ETag; requests with a matching `If-None-Match` header get a
+            304 without a body. If no plants are found, a 404 error is returned.
 
             ### Parameters:
+            - **after** (int, optional): Only return plants with an EcoPortCode greater than this value.
+            - **limit** (int, optional): The maximum number of plants to return. If more plants follow,
+              a `Link` header with `rel="next"` points to the next page.
+            - **fields** (str, optional): Comma-separated list of fields to return, e.g. `EcoPortCode,ScientificName`.
+            - **format** (str, optional): `json` (default) for a JSON array or `ndjson` for a stream of one
+              JSON object per line.
 
             ### Responses:
-            - **200 OK**: A list of all plant objects.
+            - **200 OK**: A list of plant objects.
+            - **304 Not Modified**: If the `If-None-Match` header matches the current ETag.
+            - **400 Bad Request**: If `fields` contains an unknown field.
             - **404 Not Found**: If no plants are found in the database.
 
+            ### Example Request:
+            ```
+            GET /?fields=EcoPortCode,ScientificName&limit=2
+            ```
+
             ### Example Response:
             ```
             [
                 {
                     "EcoPortCode": 123,
-                    "ScientificName": "Rosa",
-                    "TOPMN": 10.0,
-                    "TOPMX": 25.0,
-                    ...
-                }
+                    "ScientificName": "Rosa"
+                },
+                ...
             ]
             ```
             """
-        result = await session.execute(select(Plant))
-        plants = result.scalars().all()
-        if not plants:
+        if not len(catalog):
             raise HTTPException(status_code=404, detail="No plants found")
-        # Replace NaN values with None
-        plants = [_replace_nan_with_none(plant) for plant in plants]
-        return plants
+
+        projection = None
+        if fields:
+            projection = [field.strip() for field in fields.split(",") if field.strip()]
+            unknown = [field for field in projection if field not in PlantModel.model_fields]
+            if unknown:
+                raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+        etag = '"' + hashlib.blake2b(
+            f"{catalog.digest}|{after}|{limit}|{projection}|{output_format}".encode(), digest_size=16
+        ).hexdigest() + '"'
+        headers = {"ETag": etag}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        codes = catalog.codes(after=after, limit=limit)
+        if limit is not None and codes and catalog.codes(after=codes[-1], limit=1):
+            next_url = request.url.include_query_params(after=codes[-1])
+            headers["Link"] = f'<{next_url}>; rel="next"'
+
+        if output_format == "ndjson":
+            documents = catalog.json_documents(codes, projection)
+
+            def stream():
+                for start in range(0, len(documents), NDJSON_CHUNK_SIZE):
+                    yield b"".join(document + b"\n" for document in documents[start:start + NDJSON_CHUNK_SIZE])
+
+            return StreamingResponse(stream(), media_type="application/x-ndjson", headers=headers)
+
+        return Response(content=catalog.json_array(codes, projection), media_type="application/json", headers=headers)
 
     @router.get("/scientific_name/{scientific_name}", response_model=list[PlantModel])
-    async def get_plant_by_scientific_name(scientific_name: str, db: AsyncSession = Depends(get_async_session)):
+    async def get_plant_by_scientific_name(scientific_name: str):
         """
         Retrieve plants by their scientific name.
 
@@ -97,26 +153,27 @@ def get_plant_router() -> APIRouter:
         ]
         ```
         """
-        scientific_name = scientific_name.strip()
-        query = select(Plant).where(Plant.ScientificName.ilike(scientific_name))
-        result = await db.execute(query)
-        plants = result.scalars().all()
-        if not plants:
+        codes = catalog.codes_by_scientific_name(scientific_name)
+        if not codes:
             raise HTTPException(status_code=404, detail="Plant not found")
-        # Replace NaN values with None
-        plants = [_replace_nan_with_none(plant) for plant in plants]
-        return plants
+        return _json_response(codes)
 
     @router.get("/common_name/{common_name}", response_model=list[PlantModel])
-    async def get_plant_by_common_name(common_name: str, db: AsyncSession = Depends(get_async_session)):
+    async def get_plant_by_common_name(
+            common_name: str,
+            limit: int = Query(SEARCH_DEFAULT_LIMIT, ge=1, le=SEARCH_MAX_LIMIT),
+            db: AsyncSession = Depends(get_async_session)
+    ):
         """
         Retrieve plants by their common name.
 
-        This endpoint performs a case-insensitive search on the common name (COMNAME field).
+        This endpoint performs a case-insensitive, typo-tolerant search on the common name (COMNAME field).
+        Results are ranked: substring matches first, then fuzzy matches by trigram similarity.
         If no plant is found, a 404 error is returned.
 
         ### Parameters:
         - **common_name** (str): The common name to search for.
+        - **limit** (int): The maximum number of plants to return (default: 50).
 
         ### Responses:
         - **200 OK**: A list of plant objects matching the common name.
@@ -138,26 +195,70 @@ def get_plant_router() -> APIRouter:
         ]
         ```
         """
-        common_name = common_name.strip()
-        query = select(Plant).where(Plant.COMNAME.ilike(f"%{common_name}%"))
-        result = await db.execute(query)
-        plants = result.scalars().all()
-        if not plants:
+        codes = await search_plant_codes(db, common_name, COMMON_NAME_FIELDS, limit)
+        codes = [code for code in codes if catalog.get(code)]
+        if not codes:
             raise HTTPException(status_code=404, detail="No plants found")
-        # Replace NaN values with None
-        plants = [_replace_nan_with_none(plant) for plant in plants]
-        return plants
+        return _json_response(codes)
+
+    @router.get("/autocomplete", response_model=list[PlantSuggestion])
+    async def autocomplete_plant_names(
+            q: str,
+            limit: int = Query(AUTOCOMPLETE_DEFAULT_LIMIT, ge=1, le=AUTOCOMPLETE_MAX_LIMIT),
+    ):
+        """
+        Suggest plants for a typed name prefix.
+
+        This endpoint completes scientific names, common names (COMNAME) and synonyms (SYNO) from an in-memory
+        prefix index, without a database query. Matching is case- and accent-insensitive; names matching from
+        their first word are suggested before names matching from a later word. Each plant is suggested at most
+        once. An unknown prefix returns an empty list.
+
+        ### Parameters:
+        - **q** (str): The typed prefix.
+        - **limit** (int): The maximum number of suggestions to return (default: 10).
+
+        ### Responses:
+        - **200 OK**: A list of suggestions, each with the plant, the completed name and the field it comes from.
+
+        ### Example Request:
+        ```
+        GET /autocomplete?q=acacia%20sen
+        ```
+
+        ### Example Response:
+        ```
+        [
+            {
+                "EcoPortCode": 301,
+                "ScientificName": "Acacia senegal",
+                "match": "Acacia senegal",
+                "field": "ScientificName"
+            }
+        ]
+        ```
+        """
+        return [
+            PlantSuggestion(EcoPortCode=code, ScientificName=catalog.get(code).ScientificName, match=text, field=field)
+            for code, field, text in autocomplete_index.complete(q, limit)
+        ]
 
     @router.get("/search/{query}", response_model=list[PlantModel])
-    async def search_plants(query: str, db: AsyncSession = Depends(get_async_session)):
+    async def search_plants(
+            query: str,
+            limit: int = Query(SEARCH_DEFAULT_LIMIT, ge=1, le=SEARCH_MAX_LIMIT),
+            db: AsyncSession = Depends(get_async_session)
+    ):
         """
         Search plants by a general query.
 
-        This endpoint performs a case-insensitive search in the ScientificName and SYNO (synonyms) fields.
+        This endpoint performs a case-insensitive, typo-tolerant search in the ScientificName and SYNO (synonyms)
+        fields. Results are ranked: substring matches first, then fuzzy matches by trigram similarity.
         If no plant is found, a 404 error is returned.
 
         ### Parameters:
         - **query** (str): The search query to match against the ScientificName and SYNO fields.
+        - **limit** (int): The maximum number of plants to return (default: 50).
 
         ### Responses:
         - **200 OK**: A list of plant objects matching the search query.
@@ -179,23 +280,16 @@ def get_plant_router() -> APIRouter:
         ]
         ```
         """
-        query = query.strip()
-        query_stmt = select(Plant).where(
-            (Plant.ScientificName.ilike(f"%{query}%")) | (Plant.SYNO.ilike(f"%{query}%"))
-        )
-        result = await db.execute(query_stmt)
-        plants = result.scalars().all()
-        if not plants:
+        codes = await search_plant_codes(db, query, SEARCH_FIELDS, limit)
+        codes = [code for code in codes if catalog.get(code)]
+        if not codes:
             raise HTTPException(status_code=404, detail="No plants found")
-        # Replace NaN values with None
-        plants = [_replace_nan_with_none(plant) for plant in plants]
-        return plants
+        return _json_response(codes)
 
     @router.get("/suitability/{scientific_name}", response_model=PlantSuitabilityResponse)
     async def calculate_suitability_for_plant(
             scientific_name: str,
-            location: str,
-            session: AsyncSession = Depends(get_async_session)
+            location: str
     ):
         """
             Calculate the suitability of a plant for a specific location based on weather data.
@@ -238,14 +332,12 @@ def get_plant_router() -> APIRouter:
             ### Raises:
             - `HTTPException`: If the plant is not found (404) or if there are issues fetching weather data.
             """
-        query = select(Plant).where(Plant.ScientificName.ilike(scientific_name.strip()))
-        result = await session.execute(query)
-        plant = result.scalars().first()
+        plant = catalog.first_by_scientific_name(scientific_name)
 
         if not plant:
             raise HTTPException(status_code=404, detail="Plant not found.")
 
-        suitability_data = await get_weather_and_suitability(location, scientific_name, session)
+        suitability_data = await get_weather_and_suitability(location, scientific_name)
 
         plant_response = PlantSuitabilityResponse(
             **suitability_data
@@ -253,6 +345,191 @@ def get_plant_router() -> APIRouter:
 
         return plant_response
 
+    @router.post("/suitability/batch", response_class=StreamingResponse, responses={200: {"content": {"application/x-ndjson": {}}}})
+    async def calculate_suitability_batch(batch: SuitabilityBatchRequest):
+        """
+            Calculate the suitability of many plants for many locations in one request.
+
+            Every distinct location is geocoded and its weather forecast fetched once, concurrently with
+            the other locations. All requested plants are then scored against it in a single vectorized
+            pass. The scores are identical to the ones returned by `/suitability/{scientific_name}`.
+            Results are streamed as newline-delimited JSON, one line per location, in the order the
+            locations become available.
+
+            ### Request Body:
+            - **scientific_names** (list[str]): The plants to score (at most 5000).
+            - **locations** (list[str]): The locations to score them for (at most 200).
+
+            ### Responses:
+            - **200 OK**: `application/x-ndjson`, one `SuitabilityBatchResult` object per line and location
+              with the scores of all requested plants. A location that cannot be geocoded or has no weather data gets an `error` instead of scores.
+            - **404 Not Found**: If any of the scientific names is unknown.
+
+            ### Example Request:
+            ```
+            POST /suitability/batch
+            {"scientific_names": ["Rosa", "Zea mays"], "locations": ["Berlin", "Nairobi"]}
+            ```
+
+            ### Example Response:
+            ```
+            {"location": "Nairobi", "latitude": -1.28, "longitude": 36.82, "interval_used": 30, "scores": [{"EcoPortCode": 123, "ScientificName": "Rosa", "suitability_score": 80}, ...]}
+            {"location": "Berlin", "latitude": 52.52, "longitude": 13.40, "interval_used": 30, "scores": [...]}
+            ```
+            """
+        codes = []
+        unknown = []
+        for scientific_name in dict.fromkeys(batch.scientific_names):
+            matches = catalog.codes_by_scientific_name(scientific_name)
+            if matches:
+                codes.append(matches[0])
+            else:
+                unknown.append(scientific_name)
+        if unknown:
+            raise HTTPException(status_code=404, detail=f"Plants not found: {', '.join(unknown)}")
+
+        matrix = get_tolerance_matrix().subset(codes)
+
+        async def stream():
+            async for result in iter_batch_suitability(matrix, batch.locations):
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    @router.get("/heatmap/{scientific_name}")
+    async def get_suitability_heatmap(
+            scientific_name: str,
+            min_lat: float = Query(..., ge=-90, le=90),
+            min_lon: float = Query(..., ge=-180, le=180),
+            max_lat: float = Query(..., ge=-90, le=90),
+            max_lon: float = Query(..., ge=-180, le=180),
+            resolution: float = Query(0.5, ge=0.01, le=10),
+            output_format: str = Query("json", alias="format", pattern="^(json|bin)$"),
+    ):
+        """
+            Calculate a plant's suitability over a bounding box as a raster.
+
+            The box is divided into cells of `resolution` degrees and every cell centre is scored like
+            `/suitability/{scientific_name}` would score it. Cells outside the plant's latitude limits
+            (LATMN/LATMX) score 0 without any weather lookup. Forecasts are fetched with batched
+            multi-coordinate requests and shared between cells in the same forecast grid cell. Complete
+            rasters are cached on disk until the next forecast day.
+
+            The raster is a row-major uint8 array, north-most row first and west-most column first.
+            Values are scores from 0 to 100, or 255 for cells without weather data.
+
+            ### Parameters:
+            - **scientific_name** (str): The scientific name of the plant.
+            - **min_lat**, **min_lon**, **max_lat**, **max_lon** (float): The bounding box in degrees.
+            - **resolution** (float): The cell size in degrees (default: 0.5).
+            - **format** (str): `json` (default) for metadata plus the base64-encoded raster, or `bin` for the
+              raw raster bytes with the shape in the `X-Heatmap-Rows` and `X-Heatmap-Cols` headers.
+
+            ### Responses:
+            - **200 OK**: The raster.
+            - **400 Bad Request**: If the box is empty or has too many cells for the resolution.
+            - **404 Not Found**: If the plant is not found.
+
+            ### Example Request:
+            ```
+            GET /heatmap/Zea mays?min_lat=47&min_lon=5&max_lat=55&max_lon=15&resolution=0.5
+            ```
+
+            ### Example Response:
+            ```
+            {
+                "scientific_name": "Zea mays",
+                "bbox": [47.0, 5.0, 55.0, 15.0],
+                "resolution": 0.5,
+                "rows": 16,
+                "cols": 20,
+                "nodata": 255,
+                "scores": "UFBQUk9P..."
+            }
+            ```
+            """
+        plant = get_plant_data_by_scientific_name(scientific_name)
+        scores = await compute_heatmap(plant, min_lat, min_lon, max_lat, max_lon, resolution)
+        rows, cols = scores.shape
+
+        if output_format == "bin":
+            return Response(
+                content=scores.tobytes(),
+                media_type="application/octet-stream",
+                headers={"X-Heatmap-Rows": str(rows), "X-Heatmap-Cols": str(cols)},
+            )
+        return {
+            "scientific_name": plant.ScientificName,
+            "bbox": [min_lat, min_lon, max_lat, max_lon],
+            "resolution": resolution,
+            "rows": rows,
+            "cols": cols,
+            "nodata": NODATA,
+            "scores": base64.b64encode(scores.tobytes()).decode("ascii"),
+        }
+
+    @router.get("/ranking", response_model=PlantRankingResponse)
+    async def rank_plants_for_location(
+            location: str,
+            limit: int = Query(10, ge=1)
+    ):
+        """
+            Rank all plants by their suitability for a specific location.
+
+            This endpoint fetches the weather forecast for the location once and scores every plant
+            in the database against it in a single vectorized pass. The scores are identical to the
+            ones returned by `/suitability/{scientific_name}` for each individual plant.
+
+            ### Parameters:
+            - **location** (str): The location for which the plants should be ranked.
+            - **limit** (int): The maximum number of plants to return (default: 10).
+
+            ### Responses:
+            - **200 OK**: Returns a `PlantRankingResponse` with the best-suited plants first.
+            - **404 Not Found**: If there are no plants in the database.
+
+            ### Example Request:
+            ```
+            GET /ranking?location=Berlin&limit=3
+            ```
+
+            ### Example Response:
+            ```
+            {
+                "location": "Berlin",
+                "latitude": 52.52,
+                "longitude": 13.40,
+                "interval_used": 30,
+                "rankings": [
+                    {"EcoPortCode": 123, "ScientificName": "Rosa", "suitability_score": 91},
+                    ...
+                ]
+            }
+            ```
+
+            ### Raises:
+            - `HTTPException`: If no plants are found (404) or if there are issues fetching weather data.
+            """
+        matrix = get_tolerance_matrix()
+        if not len(matrix):
+            raise HTTPException(status_code=404, detail="No plants found")
+
+        latitude, longitude = await geocode_location(location)
+        daily_weather = await fetch_daily_weather(latitude, longitude)
+
+        rankings = [
+            {"EcoPortCode": code, "ScientificName": name, "suitability_score": score}
+            for code, name, score in matrix.rank(daily_weather, limit)
+        ]
+
+        return PlantRankingResponse(
+            location=location,
+            latitude=latitude,
+            longitude=longitude,
+            interval_used=30,
+            rankings=rankings,
+        )
+
     @router.put("/", response_model=PlantModel)
     async def update_plant(updated_plant: PlantModel,
                            session: AsyncSession = Depends(get_async_session)):
@@ -321,11 +598,16 @@ def get_plant_router() -> APIRouter:
         if not plant:
             raise HTTPException(status_code=404, detail="Plant not found.")
 
+        previous_code = plant.EcoPortCode
         for key, value in updated_plant.dict().items():
             setattr(plant, key, value)
 
+        await catalog.publish(session, previous_code, plant.EcoPortCode)
         await session.commit()
         await session.refresh(plant)
+        if previous_code != plant.EcoPortCode:
+            catalog.remove(previous_code)
+        catalog.upsert(plant)
         return plant
 
     @router.post("/", response_model=PlantModel)
@@ -375,8 +657,10 @@ def get_plant_router() -> APIRouter:
         # Create the new plant record
         plant = Plant(**new_plant.dict())
         session.add(plant)
+        await catalog.publish(session, plant.EcoPortCode)
         await session.commit()
         await session.refresh(plant)
+        catalog.upsert(plant)
         return plant
 
     @router.delete("/{eco_port_code}")
@@ -411,7 +695,9 @@ def get_plant_router() -> APIRouter:
             raise HTTPException(status_code=404, detail="Plant not found.")
 
         await session.delete(plant)
+        await catalog.publish(session, eco_port_code)
         await session.commit()
+        catalog.remove(eco_port_code)
         return Response(status_code=status.HTTP_204_NO_CONTENT)
 
     return router
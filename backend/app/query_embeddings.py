@@ -0,0 +1,203 @@
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from .http_client import http_client
+from .logger import logger
+
+EMBEDDING_ENDPOINT = "https://models.mylab.th-luebeck.dev/v1/embeddings"
+MODEL = "bge-m3"
+
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", 24 * 3600))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 2048))
+# Set to persist the cache across restarts (.npz, written on shutdown)
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH") or None
+# Questions arriving within this window are embedded with one upstream call
+EMBEDDING_BATCH_WINDOW = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", 5)) / 1000
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", 32))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Cache key of a question: case-folded, whitespace collapsed, trailing punctuation removed."""
+    return _WHITESPACE.sub(" ", question.casefold()).strip().rstrip("?!. ")
+
+
+async def request_embeddings(texts) -> list:
+    """Embed several texts with one request to the embedding endpoint, in input order."""
+    response = await http_client.post(EMBEDDING_ENDPOINT, json={"input": list(texts), "model": MODEL})
+    response.raise_for_status()
+    data = sorted(response.json()["data"], key=lambda item: item.get("index", 0))
+    return [item["embedding"] for item in data]
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU cache of question embeddings keyed on the normalized question, with a TTL so that
+    a model update on the embedding endpoint is picked up eventually. Timestamps are wall-clock
+    so that entries keep their age when the cache is persisted.
+    """
+
+    def __init__(self, ttl=EMBEDDING_CACHE_TTL, max_entries=EMBEDDING_CACHE_MAX_ENTRIES, path=EMBEDDING_CACHE_PATH):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+        self._entries = OrderedDict()
+        self._loaded = path is None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _store(self, key, stored_at, vector):
+        self._entries[key] = (stored_at, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key):
+        """Cached embedding of a normalized question, or None if it is missing or expired."""
+        if not self._loaded:
+            self.load()
+        entry = self._entries.get(key)
+        if entry is not None and time.time() - entry[0] < self.ttl:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+        if entry is not None:
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, vector):
+        self._store(key, time.time(), vector)
+
+    def load(self):
+        """Read the persisted entries, if any. Called on first lookup."""
+        self._loaded = True
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                persisted = list(zip(data["keys"].tolist(), data["stored_at"].tolist(), data["vectors"].tolist()))
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring query embedding cache {self.path}: {e!r}")
+            return
+        now = time.time()
+        for key, stored_at, vector in persisted:
+            if now - stored_at < self.ttl:
+                self._store(key, stored_at, vector)
+        logger.info(f"Loaded {len(self._entries)} query embeddings from {self.path}")
+
+    def save(self):
+        """Persist the cache to `path` (no-op without a path or entries)."""
+        if not self.path or not self._entries:
+            return
+        keys = list(self._entries)
+        stored_at = [self._entries[key][0] for key in keys]
+        vectors = [self._entries[key][1] for key in keys]
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp.npz"
+        np.savez(tmp_path, keys=np.asarray(keys, dtype=str), stored_at=np.asarray(stored_at),
+                 vectors=np.asarray(vectors, dtype=np.float64))
+        os.replace(tmp_path, self.path)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+class QueryEmbedder:
+    """
+    Embeds RAG questions through the cache, micro-batching the misses.
+
+    A missing question is queued instead of being sent right away. The queue is flushed with a single
+    upstream request EMBEDDING_BATCH_WINDOW after its first entry, or as soon as it holds
+    EMBEDDING_BATCH_MAX_SIZE questions. The normalized question is only the cache key: the model embeds
+    the text as the first caller asked it, and later variants with the same key reuse that vector.
+    """
+
+    def __init__(self, cache: QueryEmbeddingCache, window=EMBEDDING_BATCH_WINDOW, max_batch=EMBEDDING_BATCH_MAX_SIZE):
+        self.cache = cache
+        self.window = window
+        self.max_batch = max_batch
+        # Unresolved futures by normalized question, queued or in flight
+        self._futures = {}
+        # (normalized question, original text) pairs waiting for the next flush
+        self._queued = []
+        self._flush_handle = None
+        self._tasks = set()
+        self.batches = 0
+        self.batched_questions = 0
+
+    async def embed(self, question: str) -> list:
+        key = normalize_question(question)
+        vector = self.cache.get(key)
+        if vector is not None:
+            return vector
+
+        future = self._futures.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._futures[key] = future
+            self._queued.append((key, question))
+            if len(self._queued) >= self.max_batch:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = loop.call_later(self.window, self._flush)
+        # One caller giving up must not cancel the embedding for the others
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        queued, self._queued = self._queued, []
+        if queued:
+            task = asyncio.create_task(self._embed_batch(queued))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _embed_batch(self, queued):
+        keys = [key for key, _ in queued]
+        self.batches += 1
+        self.batched_questions += len(keys)
+        try:
+            vectors = await request_embeddings([question for _, question in queued])
+            if len(vectors) != len(keys):
+                raise ValueError(f"{len(vectors)} embeddings returned for {len(keys)} inputs")
+        except Exception as e:
+            logger.warning(f"Embedding {len(keys)} questions failed: {e!r}")
+            for key in keys:
+                future = self._futures.pop(key)
+                future.set_exception(e)
+                # Mark the exception as retrieved in case every caller has given up
+                future.exception()
+            return
+
+        for key, vector in zip(keys, vectors):
+            self.cache.put(key, vector)
+            self._futures.pop(key).set_result(vector)
+
+    def stats(self) -> dict:
+        return {
+            **self.cache.stats(),
+            "batches": self.batches,
+            "batched_questions": self.batched_questions,
+        }
+
+
+query_embedder = QueryEmbedder(QueryEmbeddingCache())
@@ -0,0 +1,118 @@
+import json
+import math
+import os
+
+import httpx
+
+from .http_client import http_client
+from .logger import logger
+
+# Any OpenAI-compatible chat completions API, e.g. a local vLLM, llama.cpp or Ollama server
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://models.mylab.th-luebeck.dev/v1")
+LLM_MODEL = os.getenv("LLM_MODEL", "llama-3.3-70b")
+LLM_API_KEY = os.getenv("LLM_API_KEY", "dummy")
+LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", 0.25))
+LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", 512))
+# Upper bound of the retrieved chunk text put into the prompt
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", 1500))
+# Rough characters per token of the Llama tokenizers on English text
+CHARS_PER_TOKEN = 4
+
+SYSTEM_PROMPT = (
+    "You are a friendly gardening assistant with a deep knowledge of botany. Answer the question using "
+    "only the plant profiles from the EcoCrop database given as context. Mention the scientific names "
+    "of the plants you recommend. If the context does not answer the question, say so."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def build_context(records, token_budget=RAG_CONTEXT_TOKEN_BUDGET):
+    """
+    Join retrieved chunks, best first, into the prompt context until the token budget is used up.
+    Duplicate chunks are skipped; a first chunk larger than the budget is truncated. Returns the context
+    and the records it includes.
+    """
+    parts = []
+    used = []
+    seen = set()
+    remaining = token_budget
+    for record in records:
+        text = (record.get("rag_chunk_text") or "").strip()
+        if not text or text in seen:
+            continue
+        tokens = estimate_tokens(text) + 1
+        if tokens > remaining:
+            if parts:
+                break
+            text = text[:remaining * CHARS_PER_TOKEN]
+        parts.append(text)
+        used.append(record)
+        seen.add(text)
+        remaining -= tokens
+    return "\n\n".join(parts), used
+
+
+def build_messages(question, context) -> list[dict]:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"Context:\n{context}\n\nQuestion: {question}"},
+    ]
+
+
+async def stream_chat_completion(messages):
+    """Yield the text deltas of a streamed chat completion. Raises httpx errors and on error responses."""
+    payload = {
+        "model": LLM_MODEL,
+        "messages": messages,
+        "temperature": LLM_TEMPERATURE,
+        "max_tokens": LLM_MAX_TOKENS,
+        "stream": True,
+    }
+    headers = {"Authorization": f"Bearer {LLM_API_KEY}"}
+    async with http_client.stream("POST", f"{LLM_BASE_URL}/chat/completions", json=payload, headers=headers) as response:
+        if response.status_code >= 400:
+            await response.aread()
+            raise httpx.HTTPStatusError(
+                f"LLM returned {response.status_code}: {response.text}", request=response.request, response=response
+            )
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+            choices = json.loads(data).get("choices") or [{}]
+            text = (choices[0].get("delta") or {}).get("content")
+            if text:
+                yield text
+
+
+def sse_event(event, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def stream_answer(question, records):
+    """
+    Server-sent events for a RAG answer: one `sources` event with the plants used as context, a `token`
+    event per generated text delta, then `done`, or `error` if generation fails midway.
+    """
+    context, used = build_context(records)
+    yield sse_event("sources", [
+        {
+            "item_id": int(record["item_id"]),
+            "scientific_name": record.get("scientific_name"),
+            "distance": float(record["distance"]) if record.get("distance") is not None else None,
+        }
+        for record in used
+    ])
+    try:
+        async for text in stream_chat_completion(build_messages(question, context)):
+            yield sse_event("token", {"text": text})
+    except (httpx.HTTPError, ValueError) as e:
+        logger.warning(f"RAG answer generation failed: {e!r}")
+        yield sse_event("error", {"detail": f"Answer generation failed: {e}"})
+        return
+    yield sse_event("done", {})
@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+from fastapi import HTTPException
+
+from .logger import logger
+from .models import RagFilters
+from .multi_hot import MULTI_HOT_PATH, MultiHotColumn, load_encodings
+from .snapshot import load_cleaned_dataset
+
+# Boolean feature columns derived by add_additional_features that queries can filter on
+FEATURE_FLAGS = [
+    "IS_DROUGHT_TOLERANT", "IS_DROUGHT_SUSCEPTIBLE", "IS_FIRE_TOLERANT", "IS_FIRE_SUSCEPTIBLE",
+    "IS_SALINE_TOLERANT", "IS_SALINE_INTOLERANT", "IS_MULTIPLE_PHOTO_PERIODS", "IS_SOIL_TEXTURE_TOLERANT",
+    "IS_HIGH_TEMPERATURE_TOLERANT", "IS_LOW_TEMPERATURE_TOLERANT", "IS_FAST_CYCLE", "IS_WIDE_PRECIP_TOLERANCE",
+    "IS_PH_FLEXIBLE", "IS_TEMP_FLEXIBLE", "HAS_MULTIPLE_COMMON_NAMES", "IS_SHALLOW_ROOTED", "IS_SHORT_DAY",
+]
+
+
+class FeatureFilterIndex:
+    """
+    Bitmap indexes over the derived plant features, with rows aligned to a given EcoPortCode order
+    (e.g. the rows of the vector index) or to the dataset order. Every feature flag is kept as a packed bitmap, list columns
+    as their multi-hot encodings, so evaluating a filter is a handful of bitwise ANDs.
+    """
+
+    def __init__(self, eco_port_codes=None):
+        df = load_cleaned_dataset(columns=["EcoPortCode", "ADAPTABILITY_SCORE"] + FEATURE_FLAGS)
+        df = df.drop_duplicates("EcoPortCode").set_index("EcoPortCode")
+        if eco_port_codes is None:
+            eco_port_codes = df.index
+        self.eco_port_codes = np.asarray(eco_port_codes, dtype=np.int64)
+        self._size = len(self.eco_port_codes)
+        df = df.reindex(self.eco_port_codes)
+        # Plants missing from the dataset match no flag and no score range
+        self._flags = {
+            flag: np.packbits(df[flag].fillna(False).astype(bool).to_numpy())
+            for flag in FEATURE_FLAGS if flag in df.columns
+        }
+        self._adaptability = df["ADAPTABILITY_SCORE"].astype(float).to_numpy()
+
+        self._encodings = {}
+        if os.path.exists(MULTI_HOT_PATH):
+            codes, encodings = load_encodings(MULTI_HOT_PATH)
+            positions = {code: position for position, code in enumerate(codes.tolist())}
+            rows = np.array([positions.get(code, -1) for code in self.eco_port_codes.tolist()], dtype=np.int64)
+            for column, encoding in encodings.items():
+                # Rows without an encoding point at an appended all-zero row
+                bits = np.vstack([encoding.bits, np.zeros((1, encoding.bits.shape[1]), dtype=np.uint8)])
+                lengths = np.append(encoding.lengths, 0)
+                self._encodings[column] = MultiHotColumn(encoding.vocabulary, bits[rows], lengths[rows])
+        else:
+            logger.warning(f"{MULTI_HOT_PATH} not found, list column filters are unavailable")
+
+    def _list_column(self, column):
+        if column not in self._encodings:
+            raise HTTPException(status_code=400, detail=f"Unknown list column filter: {column}")
+        return self._encodings[column]
+
+    def mask(self, filters: RagFilters) -> np.ndarray:
+        """Boolean array over the index rows: does the plant match every given predicate."""
+        bits = np.packbits(np.ones(self._size, dtype=bool))
+        for flag, required in filters.flags.items():
+            if flag not in self._flags:
+                raise HTTPException(status_code=400, detail=f"Unknown feature flag filter: {flag}")
+            bits &= self._flags[flag] if required else ~self._flags[flag]
+
+        # NaN scores fail both comparisons
+        if filters.min_adaptability_score is not None:
+            bits &= np.packbits(self._adaptability >= filters.min_adaptability_score)
+        if filters.max_adaptability_score is not None:
+            bits &= np.packbits(self._adaptability <= filters.max_adaptability_score)
+
+        for column, terms in filters.any_of.items():
+            bits &= np.packbits(self._list_column(column).any_of(terms))
+        for column, terms in filters.all_of.items():
+            bits &= np.packbits(self._list_column(column).all_of(terms))
+        return np.unpackbits(bits, count=self._size).astype(bool)
+
+    def matching_codes(self, filters: RagFilters) -> np.ndarray:
+        """EcoPortCodes of the plants matching every given predicate."""
+        return self.eco_port_codes[self.mask(filters)]
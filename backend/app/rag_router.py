@@ -1,54 +1,200 @@
+import os
+import threading
+from typing import Optional
+
+import httpx
+import numpy as np
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import requests
-from feast import FeatureStore
+from starlette.concurrency import run_in_threadpool
+
+from .feature_store import backend_errors, feature_store
+from .logger import logger
+from .models import RagFilters
+from .query_embeddings import query_embedder
+from .rag_answer import stream_answer
+from .rag_filters import FeatureFilterIndex
+from .vector_index import RAG_EMBEDDINGS_PATH, VectorIndex
 
-EMBEDDING_ENDPOINT = "https://models.mylab.th-luebeck.dev/v1/embeddings"
-MODEL = "bge-m3"
-FEAST_REPO_PATH = "feature_repo"
 EMBEDDING_DIM = 1024
+# "feast" queries the Feast online store, "local" an in-process index over the exported embeddings
+RAG_RETRIEVAL_BACKEND = os.getenv("RAG_RETRIEVAL_BACKEND", "feast")
+# Serve Feast queries from the local index while the feature store is unavailable
+RAG_LOCAL_FALLBACK = os.getenv("RAG_LOCAL_FALLBACK", "true").lower() in ("1", "true", "yes")
+# Filtered Feast queries fetch this many times top_k candidates and keep the matching ones
+RAG_FILTER_OVERFETCH = int(os.getenv("RAG_FILTER_OVERFETCH", 10))
 
-store = FeatureStore(repo_path=FEAST_REPO_PATH)
+# Retrieval resources are created on first use by whichever threadpool worker gets there first
+_resources = {}
+_resources_lock = threading.RLock()
 
-def _embed_text(text):
-    response = requests.post(
-        EMBEDDING_ENDPOINT,
-        json={"input": [text], "model": MODEL}
-    )
-    response.raise_for_status()
-    return response.json()["data"][0]["embedding"]
 
+def _resource(name, factory):
+    resource = _resources.get(name)
+    if resource is None:
+        with _resources_lock:
+            resource = _resources.get(name)
+            if resource is None:
+                resource = _resources[name] = factory()
+    return resource
 
-def get_rag_router() -> APIRouter:
-    router = APIRouter()
 
-    class QueryRequest(BaseModel):
-        question: str
-        top_k: int = 3
+def _get_local_index() -> VectorIndex:
+    return _resource("local_index", VectorIndex.from_parquet)
+
+
+def _get_filter_index(local) -> FeatureFilterIndex:
+    """Feature bitmaps, row-aligned with the local vector index or in dataset order for Feast."""
+    if local:
+        return _resource("local_filters", lambda: FeatureFilterIndex(_get_local_index().metadata["item_id"]))
+    return _resource("dataset_filters", FeatureFilterIndex)
 
-    @router.post("/query")
-    def query_rag(req: QueryRequest):
-        # Embed text using BGE-M3 remote model
-        embedding = _embed_text(req.question)
 
-        if not embedding or len(embedding) != EMBEDDING_DIM:
-            raise HTTPException(status_code=500, detail="Invalid embedding returned")
+def _retrieve_local(embedding, top_k, filters: RagFilters = None):
+    """The local index only scans the chunks of plants matching the filters."""
+    rows = np.flatnonzero(_get_filter_index(local=True).mask(filters)) if filters else None
+    return _get_local_index().query(embedding, top_k, rows)
 
-        result_df = store.retrieve_online_documents_v2(
+
+def _retrieve_feast(embedding, top_k, filters: RagFilters = None):
+    """Feast cannot prefilter on our derived features, so its results are over-fetched and filtered afterwards."""
+    allowed = set(_get_filter_index(local=False).matching_codes(filters).tolist()) if filters else None
+    if allowed is not None and not allowed:
+        return []
+    store = feature_store.get()
+    try:
+        records = store.retrieve_online_documents_v2(
             features=[
                 "ecocrop_embeddings:vector",
                 "ecocrop_embeddings:scientific_name",
                 "ecocrop_embeddings:rag_chunk_text",
             ],
             query=embedding,
-            top_k=req.top_k,
+            top_k=top_k if allowed is None else top_k * RAG_FILTER_OVERFETCH,
             distance_metric="COSINE",
-        ).to_df()
+        ).to_df().to_dict(orient="records")
+    except backend_errors() as e:
+        feature_store.mark_unhealthy(e)
+        raise HTTPException(status_code=503, detail=f"Feature store unavailable: {e!r}") from e
+    if allowed is not None:
+        records = [record for record in records if record["item_id"] in allowed][:top_k]
+    return records
+
+
+def _retrieve(embedding, top_k, filters: RagFilters = None):
+    """
+    Top-k chunks for a query embedding (blocking). Returns (records, backend used). Falls back to the
+    local index if the feature store is down and the exported embeddings are available.
+    """
+    if RAG_RETRIEVAL_BACKEND == "local":
+        return _retrieve_local(embedding, top_k, filters), "local"
+    try:
+        return _retrieve_feast(embedding, top_k, filters), "feast"
+    except HTTPException as e:
+        if e.status_code != 503 or not RAG_LOCAL_FALLBACK or not os.path.exists(RAG_EMBEDDINGS_PATH):
+            raise
+        logger.warning(f"Serving RAG query from the local index: {e.detail}")
+        return _retrieve_local(embedding, top_k, filters), "local"
+
+
+async def _embed_question(question):
+    """Embed a question, mapping failures of the embedding service to 503."""
+    try:
+        embedding = await query_embedder.embed(question)
+    except (httpx.HTTPError, KeyError, ValueError) as e:
+        raise HTTPException(status_code=503, detail=f"Embedding service unavailable: {e!r}") from e
+
+    if not embedding or len(embedding) != EMBEDDING_DIM:
+        raise HTTPException(status_code=500, detail="Invalid embedding returned")
+    return embedding
+
+
+def get_rag_router() -> APIRouter:
+    router = APIRouter()
+
+    class QueryRequest(BaseModel):
+        question: str
+        top_k: int = 3
+        # Restrict retrieval to plants with these derived features
+        filters: Optional[RagFilters] = None
+
+    @router.post("/query")
+    async def query_rag(req: QueryRequest):
+        # Embed text using BGE-M3 remote model (cached, concurrent questions share one request)
+        embedding = await _embed_question(req.question)
+
+        # Both backends are synchronous, keep them off the event loop
+        results, backend = await run_in_threadpool(_retrieve, embedding, req.top_k, req.filters)
 
         return {
             "question": req.question,
-            "results": result_df.to_dict(orient="records"),
+            "results": results,
+            "backend": backend,
         }
 
-    return router
+    class AnswerRequest(QueryRequest):
+        top_k: int = 5
+
+    @router.post("/answer")
+    async def answer_rag(req: AnswerRequest):
+        """
+            Answer a question with the LLM, grounded in the retrieved plant profiles, streamed as server-sent events.
+
+            The question is embedded and the top_k chunks are retrieved like in `/query`. As many of them
+            as fit into RAG_CONTEXT_TOKEN_BUDGET form the context for the chat completion, whose tokens
+            are forwarded as they are generated.
 
+            ### Request Body:
+            - **question** (str): The user's question.
+            - **top_k** (int): Number of chunks to retrieve (default 5).
+            - **filters** (RagFilters, optional): Restrict retrieval to plants with these derived features.
+
+            ### Responses:
+            - **200 OK**: `text/event-stream` with a `sources` event listing the plants used as context,
+              one `token` event per generated text delta, and a final `done` event. If generation fails
+              midway the stream ends with an `error` event instead.
+            - **503 Service Unavailable**: If the embedding service or the vector backends are unavailable.
+
+            ### Example Request:
+            ```
+            POST /answer
+            {"question": "Which crops tolerate drought and grow fast?", "filters": {"flags": {"IS_FAST_CYCLE": true}}}
+            ```
+
+            ### Example Response:
+            ```
+            event: sources
+            data: [{"item_id": 1234, "scientific_name": "Pennisetum glaucum", "distance": 0.71}]
+
+            event: token
+            data: {"text": "Pearl"}
+
+            event: done
+            data: {}
+            ```
+            """
+        embedding = await _embed_question(req.question)
+        results, _ = await run_in_threadpool(_retrieve, embedding, req.top_k, req.filters)
+        return StreamingResponse(
+            stream_answer(req.question, results),
+            media_type="text/event-stream",
+            # Keep proxies from buffering the stream
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @router.get("/health")
+    async def rag_health():
+        """State of the retrieval backends; initializes the feature store if it is not yet."""
+        status = {
+            "backend": RAG_RETRIEVAL_BACKEND,
+            "local_index": {
+                "available": os.path.exists(RAG_EMBEDDINGS_PATH),
+                "loaded": "local_index" in _resources,
+            },
+        }
+        if RAG_RETRIEVAL_BACKEND != "local":
+            status["feature_store"] = await run_in_threadpool(feature_store.check)
+        return status
+
+    return router
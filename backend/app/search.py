@@ -0,0 +1,157 @@
+from collections import defaultdict
+
+from sqlalchemy import case, func, literal, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from .catalog import catalog
+from .logger import logger
+from .models import Plant
+
+# Plant columns searched by the /search and /common_name endpoints
+SEARCH_FIELDS = ("ScientificName", "SYNO")
+COMMON_NAME_FIELDS = ("COMNAME",)
+
+# Minimum trigram similarity for fuzzy (typo tolerant) matches. Applied to pg_trgm's `<%` operator via
+# pg_trgm.word_similarity_threshold (default 0.6), so both search backends use the same cutoff.
+SIMILARITY_THRESHOLD = 0.3
+
+# Set at schema creation; False if pg_trgm is unavailable and the in-memory index must be used
+_trigram_search_available = False
+
+
+async def create_search_indexes(conn: AsyncConnection):
+    """
+    Create the pg_trgm extension and GIN trigram indexes over the lowercased searchable columns.
+    The indexes serve both the LIKE '%q%' substring matches and the fuzzy word similarity operator.
+    """
+    global _trigram_search_available
+    if conn.dialect.name != "postgresql":
+        return
+    await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    for field in SEARCH_FIELDS + COMMON_NAME_FIELDS:
+        await conn.execute(text(
+            f'CREATE INDEX IF NOT EXISTS ix_plants_{field.lower()}_trgm '
+            f'ON plants USING gin (lower("{field}") gin_trgm_ops)'
+        ))
+    _trigram_search_available = True
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def trigrams(value: str) -> set:
+    """Trigrams of every word, padded like pg_trgm (two leading blanks, one trailing blank)."""
+    result = set()
+    for word in value.lower().split():
+        padded = f"  {word} "
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+class TrigramIndex:
+    """
+    Pure-Python trigram index used when Postgres/pg_trgm is not available (e.g. SQLite in tests).
+
+    Every comma-separated value of the indexed fields (each synonym, each common name) and each of its
+    words is an entry.
+    Substring matches rank above fuzzy matches; fuzzy matches are ranked by trigram similarity.
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+        self._entries = []
+        self._postings = defaultdict(set)
+
+    def add(self, eco_port_code, document):
+        for field in self.fields:
+            value = document.get(field) or ""
+            for item in value.split(","):
+                item = item.strip().lower()
+                if not item:
+                    continue
+                words = item.split()
+                # Single words are entries too, so that a typo in one word of a binomial still matches
+                for entry in [item] + (words if len(words) > 1 else []):
+                    entry_trigrams = trigrams(entry)
+                    entry_id = len(self._entries)
+                    self._entries.append((eco_port_code, entry, entry_trigrams))
+                    for trigram in entry_trigrams:
+                        self._postings[trigram].add(entry_id)
+
+    def search(self, query, limit=None):
+        """Return (eco_port_code, rank) pairs, best match first."""
+        query = query.strip().lower()
+        if not query:
+            return []
+        query_trigrams = trigrams(query)
+
+        shared = defaultdict(int)
+        for trigram in query_trigrams:
+            for entry_id in self._postings.get(trigram, ()):
+                shared[entry_id] += 1
+
+        ranks = {}
+        for entry_id, (code, item, entry_trigrams) in enumerate(self._entries):
+            if query in item:
+                rank = 1.0 + len(query) / len(item)
+            elif entry_id in shared:
+                rank = shared[entry_id] / len(query_trigrams | entry_trigrams)
+                if rank < SIMILARITY_THRESHOLD:
+                    continue
+            else:
+                continue
+            ranks[code] = max(rank, ranks.get(code, 0.0))
+
+        ranked = sorted(ranks.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit] if limit is not None else ranked
+
+
+_memory_indexes = {}
+
+
+def _memory_index(fields) -> TrigramIndex:
+    """In-memory index over the plant catalog, rebuilt whenever the catalog changed."""
+    version, index = _memory_indexes.get(fields, (None, None))
+    if version != catalog.version:
+        index = TrigramIndex(fields)
+        for plant in catalog.plants():
+            index.add(plant.EcoPortCode, plant.model_dump(include=set(fields)))
+        _memory_indexes[fields] = (catalog.version, index)
+        logger.info(f"Built in-memory search index over {', '.join(fields)}")
+    return index
+
+
+async def search_plant_codes(session: AsyncSession, query, fields, limit=None):
+    """
+    Return the EcoPortCodes of the plants matching `query` in `fields`, best match first.
+    Uses the pg_trgm indexes on Postgres and the in-memory trigram index otherwise.
+    """
+    query = query.strip().lower()
+    if not query:
+        return []
+
+    if not _trigram_search_available or session.bind.dialect.name != "postgresql":
+        return [code for code, _ in _memory_index(fields).search(query, limit)]
+
+    # `<%` keeps using the trigram indexes; its threshold is set for this transaction only
+    await session.execute(
+        select(func.set_config("pg_trgm.word_similarity_threshold", str(SIMILARITY_THRESHOLD), True))
+    )
+    pattern = f"%{_escape_like(query)}%"
+    columns = [func.lower(getattr(Plant, field)) for field in fields]
+    rank = func.greatest(*[
+        func.word_similarity(query, column) + case((column.like(pattern, escape="\\"), 1.0), else_=0.0)
+        for column in columns
+    ])
+    statement = (
+        select(Plant.EcoPortCode)
+        .where(or_(
+            *[column.like(pattern, escape="\\") for column in columns],
+            *[literal(query).op("<%")(column) for column in columns],
+        ))
+        .order_by(rank.desc(), Plant.EcoPortCode)
+        .limit(limit)
+    )
+    result = await session.execute(statement)
+    return list(result.scalars().all())
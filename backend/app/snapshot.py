@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc
+
+from .logger import logger
+
+# Bump whenever the layout of the cleaned dataset changes so that stale snapshots are ignored
+SNAPSHOT_VERSION = 1
+SNAPSHOT_PATH = os.path.join("resources", "cleaned_ecocrop.arrow")
+EXCEL_PATH = os.path.join("resources", "Cleaned_EcoCrop_DB_Final.xlsx")
+
+
+def _manifest_path(path):
+    return f"{path}.json"
+
+
+# (path, size, mtime_ns, sha256) of snapshot files whose checksum has been verified in this process
+_verified = set()
+
+
+def _file_stat(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _file_sha256(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_snapshot(df: pd.DataFrame, path=SNAPSHOT_PATH) -> dict:
+    """
+    Write the cleaned dataset as an uncompressed Arrow IPC file that can be memory-mapped.
+    List columns are stored as native Arrow list types. A JSON manifest next to the file
+    records the snapshot version and the SHA-256 of the file.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[b"snapshot_version"] = str(SNAPSHOT_VERSION).encode()
+    table = table.replace_schema_metadata(metadata)
+
+    tmp_path = f"{path}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, path)
+
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "sha256": _file_sha256(path),
+        "rows": table.num_rows,
+        "columns": table.num_columns,
+    }
+    with open(_manifest_path(path), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def verify_snapshot_checksum(path, manifest):
+    """
+    Raise ValueError unless the file matches the manifest's SHA-256. Each file is hashed once per
+    process; it is hashed again only if it has been replaced (its size or mtime changed) since.
+    """
+    key = (path, *_file_stat(path), manifest.get("sha256"))
+    if key in _verified:
+        return
+    if _file_sha256(path) != manifest.get("sha256"):
+        raise ValueError("Snapshot checksum mismatch")
+    _verified.add(key)
+
+
+def read_snapshot(path=SNAPSHOT_PATH, columns=None) -> pd.DataFrame:
+    """
+    Memory-map a snapshot written by write_snapshot and return it as a DataFrame.
+    List columns are returned as Python lists, like the transformer produces them.
+    Raises ValueError if the snapshot version or checksum does not match.
+    """
+    with open(_manifest_path(path)) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Snapshot version {manifest.get('version')} != {SNAPSHOT_VERSION}")
+    verify_snapshot_checksum(path, manifest)
+
+    table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    if columns is not None:
+        table = table.select([column for column in columns if column in table.column_names])
+
+    df = table.to_pandas()
+    for field in table.schema:
+        if pa.types.is_list(field.type) or pa.types.is_large_list(field.type):
+            df[field.name] = table.column(field.name).to_pylist()
+    return df
+
+
+def load_cleaned_dataset(columns=None) -> pd.DataFrame:
+    """
+    Load the cleaned EcoCrop dataset, preferring the Arrow snapshot over the Excel export.
+    Falls back to Excel if the snapshot is missing, outdated or corrupt.
+    """
+    if os.path.exists(SNAPSHOT_PATH):
+        try:
+            return read_snapshot(SNAPSHOT_PATH, columns)
+        except (OSError, ValueError, KeyError, pa.ArrowException) as e:
+            logger.warning(f"Ignoring snapshot {SNAPSHOT_PATH}: {e}")
+
+    df = pd.read_excel(EXCEL_PATH)
+    if columns is not None:
+        df = df[[column for column in columns if column in df.columns]]
+    return df
@@ -1,11 +1,19 @@
-import requests
+import asyncio
 import datetime
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
+
+import httpx
+import numpy as np
 from fastapi import HTTPException
 
+from .catalog import catalog
+from .geocoding import geocoder, normalize_location_query
+from .http_client import http_client
 from .logger import logger
-from .models import Plant
+from .models import PlantModel
+from .weather_cache import weather_cache
+
+# Locations geocoded and fetched concurrently by a batch suitability request
+BATCH_LOCATION_CONCURRENCY = 8
 
 
 # Helper function for calculating temperature suitability scores
@@ -100,43 +108,217 @@ def calculate_suitability_score(weather_data, plant) -> int:
     return int(final_suitability_score)
 
 
-async def get_plant_data_by_scientific_name(scientific_name: str, session: AsyncSession) -> Plant:
+def piecewise_suitability(values, optimal_min, optimal_max, absolute_min, absolute_max):
+    """
+    Vectorized counterpart of the piecewise-linear scoring used for temperature and precipitation.
+    All arguments are broadcast against each other. The branch order and arithmetic mirror the
+    scalar implementation, so every element equals the score the per-value code would produce.
+    """
+    values = np.asarray(values, dtype=float)
+
+    # Every branch is evaluated for every element; degenerate ranges only produce inf/nan in
+    # elements whose branch is never selected.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        below_optimum = 50 + 50 * (values - absolute_min) / (optimal_min - absolute_min)
+        above_optimum = 50 + 50 * (absolute_max - values) / (absolute_max - optimal_max)
+
+    deviation = np.abs(values - np.where(values > absolute_max, absolute_max, absolute_min))
+    extreme = 100 - deviation * 10
+    extreme = np.where(extreme > 0, extreme, 0.0)
+
+    return np.select(
+        [
+            (optimal_min <= values) & (values <= optimal_max),
+            (absolute_min <= values) & (values < optimal_min),
+            (optimal_max < values) & (values <= absolute_max),
+        ],
+        [100.0, below_optimum, above_optimum],
+        default=extreme,
+    )
+
+
+def calculate_suitability_scores(weather_data, tolerances) -> np.ndarray:
+    """
+    Score many plants against one weather series at once.
+    `tolerances` maps TOPMN/TOPMX/TMIN/TMAX/ROPMN/ROPMX/RMIN/RMAX to arrays with one entry per plant.
+    Returns an integer array with the same values calculate_suitability_score returns per plant.
+    """
+    total_precipitation_30_days = sum(weather_data['precipitation_sum'])
+    annualized_precipitation = total_precipitation_30_days * (365 / 30)
+
+    precip_scores = piecewise_suitability(
+        annualized_precipitation,
+        tolerances["ROPMN"], tolerances["ROPMX"], tolerances["RMIN"], tolerances["RMAX"],
+    )
+
+    # Same truncation as zip() in the scalar implementation
+    days = min(len(weather_data['temperature_2m_min']),
+               len(weather_data['temperature_2m_max']),
+               len(weather_data['temperature_2m_mean']))
+    temperatures = np.array([
+        weather_data['temperature_2m_mean'][:days],
+        weather_data['temperature_2m_min'][:days],
+        weather_data['temperature_2m_max'][:days],
+    ], dtype=float)
+
+    # Shape (3, plants, days): mean/min/max scores for every plant and day
+    temp_scores = piecewise_suitability(
+        temperatures[:, None, :],
+        np.asarray(tolerances["TOPMN"], dtype=float)[:, None],
+        np.asarray(tolerances["TOPMX"], dtype=float)[:, None],
+        np.asarray(tolerances["TMIN"], dtype=float)[:, None],
+        np.asarray(tolerances["TMAX"], dtype=float)[:, None],
+    )
+    daily_scores = ((temp_scores[0] + temp_scores[1] + temp_scores[2]) / 3 + precip_scores[:, None]) / 2
+
+    # Accumulate day by day to keep the summation order (and rounding) of the scalar sum()
+    total = np.zeros(daily_scores.shape[0])
+    for day in range(days):
+        total = total + daily_scores[:, day]
+
+    return (total / days).astype(int)
+
+
+class BreakpointTable:
+    """
+    Piecewise-linear score of one tolerance range (temperature or precipitation), compiled into a
+    breakpoint table: the segment edges [absolute_min, optimal_min, optimal_max, absolute_max] and per
+    segment the coefficients of `base + scale * (value - anchor) / width`.
+
+    Segments: 0 below absolute_min, 1 ramp up to optimal_min, 2 optimal range (inclusive),
+    3 ramp down to absolute_max, 4 above absolute_max. Each segment's coefficients reproduce the
+    arithmetic of the scalar branch exactly, so results are identical to the scalar code.
+    Ranges with unordered breakpoints cannot be segmented and fall back to piecewise_suitability.
     """
-    Retrieve plant data from the database using the scientific name.
-    Raises a 404 HTTPException if the plant is not found in the database.
+
+    def __init__(self, optimal_min, optimal_max, absolute_min, absolute_max):
+        self.parameters = (optimal_min, optimal_max, absolute_min, absolute_max)
+        self.ordered = absolute_min <= optimal_min <= optimal_max <= absolute_max
+
+        # One right-sided search finds the segment: values equal to optimal_max/absolute_max still
+        # belong to the segment below them, so those edges are moved up by one ulp.
+        self.edges = np.array([
+            absolute_min, optimal_min, np.nextafter(optimal_max, np.inf), np.nextafter(absolute_max, np.inf)
+        ], dtype=float)
+        low_width = (optimal_min - absolute_min) or 1.0
+        high_width = (absolute_max - optimal_max) or 1.0
+        self.base = np.array([100.0, 50.0, 100.0, 50.0, 100.0])
+        self.scale = np.array([10.0, 50.0, 0.0, -50.0, -10.0])
+        self.anchor = np.array([absolute_min, absolute_min, 0.0, absolute_max, absolute_max], dtype=float)
+        self.width = np.array([1.0, low_width, 1.0, high_width, 1.0], dtype=float)
+
+    def score(self, values) -> np.ndarray:
+        values = np.asarray(values, dtype=float)
+        if not self.ordered:
+            return piecewise_suitability(values, *self.parameters)
+
+        segments = np.searchsorted(self.edges, values, side="right")
+        scores = self.base[segments] + self.scale[segments] * (values - self.anchor[segments]) / self.width[segments]
+        # Scores far outside the absolute range (and NaN) are 0, like max(0, ...) in the scalar code
+        return np.where(scores > 0, scores, 0.0)
+
+
+class SuitabilityTable:
+    """Compiled temperature and precipitation breakpoint tables of one plant."""
+
+    def __init__(self, plant):
+        self.eco_port_code = plant.EcoPortCode
+        self.temperature = BreakpointTable(plant.TOPMN, plant.TOPMX, plant.TMIN, plant.TMAX)
+        self.precipitation = BreakpointTable(plant.ROPMN, plant.ROPMX, plant.RMIN, plant.RMAX)
+
+    def daily_scores(self, weather_data) -> np.ndarray:
+        """Combined temperature and precipitation score of every forecast day."""
+        annualized_precipitation = sum(weather_data['precipitation_sum']) * (365 / 30)
+        precip_score = self.precipitation.score(annualized_precipitation)
+
+        # Same truncation as zip() in the scalar implementation
+        days = min(len(weather_data['temperature_2m_min']),
+                   len(weather_data['temperature_2m_max']),
+                   len(weather_data['temperature_2m_mean']))
+        temp_scores = self.temperature.score(np.array([
+            weather_data['temperature_2m_mean'][:days],
+            weather_data['temperature_2m_min'][:days],
+            weather_data['temperature_2m_max'][:days],
+        ], dtype=float))
+        return ((temp_scores[0] + temp_scores[1] + temp_scores[2]) / 3 + precip_score) / 2
+
+    def score(self, weather_data) -> int:
+        """Same result as calculate_suitability_score(weather_data, plant)."""
+        daily_scores = self.daily_scores(weather_data).tolist()
+        # Python's sum() to match the scalar implementation's rounding on every Python version
+        return int(sum(daily_scores) / len(daily_scores))
+
+
+class SuitabilityTables:
     """
-    query = select(Plant).where(Plant.ScientificName.ilike(scientific_name))
-    result = await session.execute(query)
-    plant = result.scalars().first()
+    SuitabilityTable of every catalog plant by EcoPortCode. Subscribed to the plant catalog
+    (see PlantCatalog.subscribe), so a plant's table is rebuilt whenever the plant is written.
+    """
+
+    def __init__(self):
+        self._tables = {}
+
+    def __len__(self):
+        return len(self._tables)
+
+    def clear(self):
+        self._tables.clear()
+
+    def add(self, plant):
+        self._tables[plant.EcoPortCode] = SuitabilityTable(plant)
+
+    def remove(self, eco_port_code):
+        self._tables.pop(eco_port_code, None)
+
+    def get(self, plant) -> SuitabilityTable:
+        """Table of a catalog plant; plants outside the catalog are compiled on the fly."""
+        table = self._tables.get(plant.EcoPortCode)
+        if table is None:
+            table = SuitabilityTable(plant)
+        return table
+
+
+suitability_tables = SuitabilityTables()
+
+
+def build_suitability_tables():
+    """Compile the tables of all catalog plants and keep them updated on every catalog change."""
+    catalog.subscribe(suitability_tables)
+    logger.info(f"Compiled suitability tables for {len(suitability_tables)} plants")
+
+
+def get_plant_data_by_scientific_name(scientific_name: str) -> PlantModel:
+    """
+    Retrieve plant data from the plant catalog using the scientific name.
+    Raises a 404 HTTPException if the plant is not found.
+    """
+    plant = catalog.first_by_scientific_name(scientific_name)
     if not plant:
         raise HTTPException(status_code=404, detail="Plant not found")
     return plant
 
 
-async def get_weather_and_suitability(location, scientific_name, session: AsyncSession):
+async def geocode_location(location):
     """
-    Fetch weather data for a given location and calculate the suitability of the location for growing the specified plant
-    The process involves:
-    1. Geocoding the location to obtain latitude and longitude.
-    2. Retrieving plant data based on the scientific name.
-    3. Fetching historical weather data for the last 30 days.
-    4. Calculating the plant suitability score
+    Resolve a location into a (latitude, longitude) pair.
+    Tuples are treated as already geocoded coordinates; strings are resolved through the cached geocoder.
     """
+    return await geocoder.geocode(location)
 
-    # Geocode the location to get latitude and longitude
-    if isinstance(location, tuple):
-        latitude, longitude = location
-    else:
-        geocode_url = f"https://geocode.xyz/{location}?json=1"
-        geocode_response = requests.get(geocode_url)
-        geocode_data = geocode_response.json()
-        latitude = float(geocode_data['latt'])
-        longitude = float(geocode_data['longt'])
 
-    # Step 2: Fetch plant data from the database
-    plant = await get_plant_data_by_scientific_name(scientific_name, session)
+async def fetch_daily_weather(latitude, longitude):
+    """
+    Return the cleaned daily forecast for the next 14 days (+today).
+    Forecasts are cached per forecast grid cell and day, see weather_cache.
+    """
+    return await weather_cache.get_or_fetch(latitude, longitude, request_daily_weather)
 
-    # Step 3: Fetch forecast  weather data for next 14 days (+today)
+
+async def request_daily_weather(latitude, longitude):
+    """
+    Fetch the daily forecast for the next 14 days (+today) and return the cleaned daily series.
+    Raises a 500 HTTPException if the weather API fails or returns incomplete data.
+    """
     start_date = datetime.date.today()
     end_date = start_date + datetime.timedelta(days=15)
 
@@ -145,7 +327,11 @@ async def get_weather_and_suitability(location, scientific_name, session: AsyncS
 
     logger.debug(f"Weather API URL: {weather_url}")
 
-    weather_response = requests.get(weather_url)
+    try:
+        weather_response = await http_client.get(weather_url)
+    except httpx.HTTPError as e:
+        logger.error(f"Failed to retrieve weather data: {e!r}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve weather data: upstream unavailable")
     if weather_response.status_code != 200:
         logger.error(f"Failed to retrieve weather data: {weather_response.text}")
         raise HTTPException(status_code=500, detail=f"Failed to retrieve weather data: {weather_response.text}")
@@ -155,7 +341,48 @@ async def get_weather_and_suitability(location, scientific_name, session: AsyncS
         logger.error("No daily weather data found in the API response.")
         raise HTTPException(status_code=500, detail="No daily weather data found in the API response.")
 
-    daily_weather = weather_data.get("daily", {})
+    return clean_daily_weather(weather_data.get("daily", {}))
+
+
+async def request_daily_weather_batch(coordinates):
+    """
+    Fetch the daily forecasts of many (latitude, longitude) pairs with a single open-meteo request.
+    Returns one cleaned daily series per pair, or None for pairs without usable data.
+    Raises a 500 HTTPException if the request itself fails.
+    """
+    start_date = datetime.date.today()
+    end_date = start_date + datetime.timedelta(days=15)
+    latitudes = ",".join(str(latitude) for latitude, _ in coordinates)
+    longitudes = ",".join(str(longitude) for _, longitude in coordinates)
+    weather_url = f"https://api.open-meteo.com/v1/forecast?latitude={latitudes}&longitude={longitudes}&start_date={start_date}&end_date={end_date}&daily=temperature_2m_max,temperature_2m_min,temperature_2m_mean,precipitation_sum"
+
+    try:
+        weather_response = await http_client.get(weather_url)
+    except httpx.HTTPError as e:
+        logger.error(f"Failed to retrieve batched weather data: {e!r}")
+        raise HTTPException(status_code=500, detail="Failed to retrieve weather data: upstream unavailable")
+    if weather_response.status_code != 200:
+        logger.error(f"Failed to retrieve batched weather data: {weather_response.text}")
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve weather data: {weather_response.text}")
+
+    # A single coordinate pair is answered with an object instead of a list
+    locations = weather_response.json()
+    if isinstance(locations, dict):
+        locations = [locations]
+
+    daily_series = []
+    for location in locations:
+        try:
+            daily_series.append(clean_daily_weather(location.get("daily", {})))
+        except HTTPException:
+            daily_series.append(None)
+    return daily_series
+
+
+def clean_daily_weather(daily_weather):
+    """
+    Drop missing values from the open-meteo daily series and validate that every series has data.
+    """
     temperature_2m_max = [t for t in daily_weather.get('temperature_2m_max', []) if t is not None]
     temperature_2m_min = [t for t in daily_weather.get('temperature_2m_min', []) if t is not None]
     temperature_2m_mean = [t for t in daily_weather.get('temperature_2m_mean', []) if t is not None]
@@ -171,12 +398,35 @@ async def get_weather_and_suitability(location, scientific_name, session: AsyncS
     logger.debug(f"Temperature Mean Data: {temperature_2m_mean}")
     logger.debug(f"Precipitation Data: {precipitation_sum}")
 
+    return {
+        "temperature_2m_max": temperature_2m_max,
+        "temperature_2m_min": temperature_2m_min,
+        "temperature_2m_mean": temperature_2m_mean,
+        "precipitation_sum": precipitation_sum,
+    }
+
+
+async def get_weather_and_suitability(location, scientific_name):
+    """
+    Fetch weather data for a given location and calculate the suitability of the location for growing the specified plant
+    The process involves:
+    1. Geocoding the location to obtain latitude and longitude.
+    2. Retrieving plant data based on the scientific name.
+    3. Fetching historical weather data for the last 30 days.
+    4. Calculating the plant suitability score
+    """
+
+    # Geocode the location to get latitude and longitude
+    latitude, longitude = await geocode_location(location)
+
+    # Step 2: Fetch plant data from the catalog
+    plant = get_plant_data_by_scientific_name(scientific_name)
+
+    # Step 3: Fetch forecast  weather data for next 14 days (+today)
+    daily_weather = await fetch_daily_weather(latitude, longitude)
+
     # Calculate the final suitability score using the daily max/min/mean temperatures and annualized precipitation
-    final_suitability_score = calculate_suitability_score(
-        {"temperature_2m_max": temperature_2m_max, "temperature_2m_min": temperature_2m_min,
-         "temperature_2m_mean": temperature_2m_mean, "precipitation_sum": precipitation_sum},
-        plant
-    )
+    final_suitability_score = suitability_tables.get(plant).score(daily_weather)
 
     response_data = {
         "location": location,
@@ -188,9 +438,56 @@ async def get_weather_and_suitability(location, scientific_name, session: AsyncS
             "interval_used": 30  # Indicates the 30-day interval used for the calculation
         },
         "weather_data": {
-            "temperature_2m_mean": temperature_2m_mean,
-            "precipitation_sum": precipitation_sum
+            "temperature_2m_mean": daily_weather["temperature_2m_mean"],
+            "precipitation_sum": daily_weather["precipitation_sum"]
         }
     }
 
     return response_data
+
+
+async def iter_batch_suitability(matrix, locations):
+    """
+    Score every plant of a ToleranceMatrix for every location, yielding one result dict per location
+    as soon as its weather is available.
+
+    Geocoding and weather requests are made once per distinct (normalized) location, at most
+    BATCH_LOCATION_CONCURRENCY at a time. All plants are scored against a location in one vectorized
+    pass. A location that fails yields a result with an `error` instead of aborting the batch.
+    """
+    locations_by_query = {}
+    for location in dict.fromkeys(locations):
+        locations_by_query.setdefault(normalize_location_query(location), []).append(location)
+
+    semaphore = asyncio.Semaphore(BATCH_LOCATION_CONCURRENCY)
+
+    async def resolve(query):
+        async with semaphore:
+            location = locations_by_query[query][0]
+            try:
+                latitude, longitude = await geocode_location(location)
+                daily_weather = await fetch_daily_weather(latitude, longitude)
+            except HTTPException as e:
+                return query, None, None, None, e.detail
+            return query, latitude, longitude, daily_weather, None
+
+    tasks = [asyncio.create_task(resolve(query)) for query in locations_by_query]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            query, latitude, longitude, daily_weather, error = await next_done
+            if error is None:
+                scores = [
+                    {"EcoPortCode": int(code), "ScientificName": name, "suitability_score": int(score)}
+                    for code, name, score in zip(matrix.eco_port_codes, matrix.scientific_names,
+                                                 matrix.score(daily_weather))
+                ]
+            for location in locations_by_query[query]:
+                if error is None:
+                    yield {"location": location, "latitude": latitude, "longitude": longitude,
+                           "interval_used": 30, "scores": scores}
+                else:
+                    yield {"location": location, "error": error}
+    finally:
+        # The client may disconnect mid-stream
+        for task in tasks:
+            task.cancel()
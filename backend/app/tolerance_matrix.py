@@ -0,0 +1,77 @@
+import numpy as np
+
+from .catalog import catalog
+from .logger import logger
+from .suitability import calculate_suitability_scores
+
+# Plant tolerance parameters used by the suitability score, in matrix column order
+TOLERANCE_COLUMNS = ["TOPMN", "TOPMX", "TMIN", "TMAX", "ROPMN", "ROPMX", "RMIN", "RMAX"]
+
+
+class ToleranceMatrix:
+    """
+    In-memory matrix of the temperature and rainfall tolerances of every plant.
+    Row i holds the TOLERANCE_COLUMNS of the plant with eco_port_codes[i].
+    """
+
+    def __init__(self, eco_port_codes, scientific_names, values):
+        self.eco_port_codes = np.asarray(eco_port_codes, dtype=np.int64)
+        self.scientific_names = list(scientific_names)
+        self.values = np.asarray(values, dtype=float).reshape(len(self.scientific_names), len(TOLERANCE_COLUMNS))
+
+    def __len__(self):
+        return len(self.scientific_names)
+
+    def column(self, name) -> np.ndarray:
+        return self.values[:, TOLERANCE_COLUMNS.index(name)]
+
+    def subset(self, eco_port_codes) -> "ToleranceMatrix":
+        """Matrix of the given plants, in the given order. Every code must be part of this matrix."""
+        positions = {int(code): i for i, code in enumerate(self.eco_port_codes)}
+        rows = [positions[code] for code in eco_port_codes]
+        return ToleranceMatrix(
+            self.eco_port_codes[rows], [self.scientific_names[i] for i in rows], self.values[rows]
+        )
+
+    def score(self, weather_data) -> np.ndarray:
+        """Suitability score of every plant for the given daily weather series."""
+        return calculate_suitability_scores(
+            weather_data,
+            {name: self.column(name) for name in TOLERANCE_COLUMNS},
+        )
+
+    def rank(self, weather_data, limit=None):
+        """
+        Return (eco_port_code, scientific_name, score) tuples ordered from the best to the worst fit.
+        Plants with equal scores keep their EcoPortCode order.
+        """
+        scores = self.score(weather_data)
+        order = np.argsort(-scores, kind="stable")
+        if limit is not None:
+            order = order[:limit]
+        return [(int(self.eco_port_codes[i]), self.scientific_names[i], int(scores[i])) for i in order]
+
+
+def build_tolerance_matrix(plants) -> ToleranceMatrix:
+    """Build the tolerance matrix from plant objects (ORM rows or PlantModels)."""
+    plants = list(plants)
+    matrix = ToleranceMatrix(
+        [plant.EcoPortCode for plant in plants],
+        [plant.ScientificName for plant in plants],
+        [[getattr(plant, column) for column in TOLERANCE_COLUMNS] for plant in plants],
+    )
+    logger.info(f"Built tolerance matrix for {len(matrix)} plants")
+    return matrix
+
+
+_tolerance_matrix = None
+_catalog_version = None
+
+
+def get_tolerance_matrix() -> ToleranceMatrix:
+    """Return the tolerance matrix of the plant catalog, rebuilding it whenever the catalog changed."""
+    global _tolerance_matrix, _catalog_version
+    if _tolerance_matrix is None or _catalog_version != catalog.version:
+        _catalog_version = catalog.version
+        _tolerance_matrix = build_tolerance_matrix(catalog.plants())
+    return _tolerance_matrix
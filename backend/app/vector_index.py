@@ -0,0 +1,143 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+from .feature_store import FEAST_REPO_PATH
+from .logger import logger
+
+RAG_EMBEDDINGS_PATH = os.getenv(
+    "RAG_EMBEDDINGS_PATH", os.path.join(FEAST_REPO_PATH, "data", "ecocrop_rag_embeddings.parquet")
+)
+# "exact" scans all vectors; "ivf" only the clusters closest to the query
+RAG_INDEX_MODE = os.getenv("RAG_INDEX_MODE", "exact")
+RAG_IVF_NPROBE = int(os.getenv("RAG_IVF_NPROBE", 8))
+
+METADATA_COLUMNS = ["item_id", "scientific_name", "rag_chunk_text"]
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def _top_k(scores: np.ndarray, k) -> np.ndarray:
+    """Positions of the k highest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def _matrix_cache_path(parquet_path):
+    """Float32 copy of the vectors next to the Parquet file, named after the file's size and mtime."""
+    stat = os.stat(parquet_path)
+    return f"{parquet_path}.{stat.st_size}-{int(stat.st_mtime)}.f32.npy"
+
+
+def _remove_stale_matrix_caches(parquet_path, current_path):
+    """Delete the matrix caches of earlier versions of the Parquet file."""
+    for path in glob.glob(f"{glob.escape(parquet_path)}.*.f32.npy"):
+        if path != current_path:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"Could not remove stale vector cache {path}: {e!r}")
+
+
+class VectorIndex:
+    """
+    In-process cosine similarity index over the RAG chunk embeddings.
+
+    Vectors are L2-normalized float32 rows; a query is one matrix-vector product followed by an
+    argpartition top-k. In "ivf" mode the rows are clustered with k-means and a query only scans the
+    RAG_IVF_NPROBE clusters with the closest centroids, trading exactness for speed on larger corpora.
+    """
+
+    def __init__(self, vectors, metadata: pd.DataFrame, mode="exact", nprobe=RAG_IVF_NPROBE):
+        self.vectors = vectors
+        self.metadata = metadata.reset_index(drop=True)
+        self.mode = mode
+        self.nprobe = nprobe
+        self._centroids = None
+        self._lists = None
+        if mode == "ivf":
+            self._build_ivf()
+        elif mode != "exact":
+            raise ValueError(f"Unknown vector index mode: {mode}")
+
+    def __len__(self):
+        return len(self.metadata)
+
+    @classmethod
+    def from_parquet(cls, path=RAG_EMBEDDINGS_PATH, mode=RAG_INDEX_MODE) -> "VectorIndex":
+        """
+        Load the embeddings written by the feature repo's embedding generator. The normalized float32
+        matrix is cached as .npy next to the Parquet file and memory-mapped on later loads.
+        """
+        matrix_path = _matrix_cache_path(path)
+        metadata = pd.read_parquet(path, columns=METADATA_COLUMNS)
+        if not os.path.exists(matrix_path):
+            vectors = pd.read_parquet(path, columns=["vector"])["vector"]
+            matrix = _normalize_rows(np.vstack(vectors.to_numpy()).astype(np.float32))
+            # Per-process temporary file: workers loading at the same time must not write into the same file
+            tmp_path = f"{matrix_path}.{os.getpid()}.tmp.npy"
+            np.save(tmp_path, matrix)
+            os.replace(tmp_path, matrix_path)
+            _remove_stale_matrix_caches(path, matrix_path)
+        vectors = np.load(matrix_path, mmap_mode="r")
+        logger.info(f"Loaded {len(metadata)} RAG vectors ({mode} index) from {path}")
+        return cls(vectors, metadata, mode=mode)
+
+    def _build_ivf(self, iterations=10, seed=0):
+        rows = len(self.vectors)
+        clusters = max(1, int(np.sqrt(rows)))
+        rng = np.random.default_rng(seed)
+        data = np.asarray(self.vectors)
+        centroids = data[rng.choice(rows, clusters, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(data @ centroids.T, axis=1)
+            for cluster in range(clusters):
+                members = data[assignment == cluster]
+                if len(members):
+                    centroids[cluster] = members.mean(axis=0)
+            centroids = _normalize_rows(centroids)
+        assignment = np.argmax(data @ centroids.T, axis=1)
+        self._centroids = centroids
+        self._lists = [np.flatnonzero(assignment == cluster) for cluster in range(clusters)]
+
+    def search(self, query, top_k, rows=None):
+        """
+        Return (row positions, cosine similarities) of the top_k most similar vectors, best first.
+        `rows` restricts the search to the given row positions (a metadata prefilter); such subsets are
+        always scanned exactly.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+
+        if rows is not None:
+            scores = self.vectors[rows] @ query
+            best = _top_k(scores, top_k)
+            return rows[best], scores[best]
+
+        if self.mode == "exact":
+            scores = self.vectors @ query
+            positions = _top_k(scores, top_k)
+            return positions, scores[positions]
+
+        probes = _top_k(self._centroids @ query, self.nprobe)
+        candidates = np.concatenate([self._lists[probe] for probe in probes])
+        scores = self.vectors[candidates] @ query
+        best = _top_k(scores, top_k)
+        return candidates[best], scores[best]
+
+    def query(self, query, top_k, rows=None) -> list[dict]:
+        """Records shaped like Feast's retrieve_online_documents_v2 output, with cosine similarity as distance."""
+        positions, scores = self.search(query, top_k, rows)
+        records = self.metadata.iloc[positions].to_dict(orient="records")
+        for record, position, score in zip(records, positions, scores):
+            record["vector"] = self.vectors[position].tolist()
+            record["distance"] = float(score)
+        return records
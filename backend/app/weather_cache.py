@@ -0,0 +1,128 @@
+import asyncio
+import datetime
+import os
+import time
+from collections import OrderedDict
+
+from .logger import logger
+
+# Open-meteo's best_match forecast models resolve to roughly 0.1° (~11 km); coordinates inside one
+# grid cell return the same forecast, so they share a cache entry.
+WEATHER_GRID_RESOLUTION = float(os.getenv("WEATHER_GRID_RESOLUTION", 0.1))
+# Entries are fresh for WEATHER_CACHE_TTL seconds, then served stale for up to
+# WEATHER_CACHE_STALE_TTL more seconds while a background refresh runs.
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", 3600))
+WEATHER_CACHE_STALE_TTL = float(os.getenv("WEATHER_CACHE_STALE_TTL", 6 * 3600))
+WEATHER_CACHE_MAX_ENTRIES = int(os.getenv("WEATHER_CACHE_MAX_ENTRIES", 4096))
+
+
+def snap_to_grid(value, resolution=WEATHER_GRID_RESOLUTION) -> float:
+    """Snap a coordinate to the centre of its forecast grid cell."""
+    return round(round(value / resolution) * resolution, 6)
+
+
+class WeatherCache:
+    """
+    Bounded LRU cache of daily forecasts keyed on grid-snapped coordinates and forecast date.
+
+    Fresh entries are returned directly. Entries past their TTL but inside the stale window are
+    returned immediately while a single background task refreshes them (stale-while-revalidate).
+    Anything older is refetched synchronously.
+    """
+
+    def __init__(self, ttl=WEATHER_CACHE_TTL, stale_ttl=WEATHER_CACHE_STALE_TTL,
+                 max_entries=WEATHER_CACHE_MAX_ENTRIES, resolution=WEATHER_GRID_RESOLUTION):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.resolution = resolution
+        self._entries = OrderedDict()
+        self._refreshing = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refresh_failures = 0
+
+    def key(self, latitude, longitude, forecast_date=None):
+        return (
+            snap_to_grid(latitude, self.resolution),
+            snap_to_grid(longitude, self.resolution),
+            forecast_date or datetime.date.today(),
+        )
+
+    def _store(self, key, value):
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def _refresh(self, key, fetch):
+        try:
+            self._store(key, await fetch(key[0], key[1]))
+        except Exception as e:
+            self.refresh_failures += 1
+            logger.warning(f"Background weather refresh for {key} failed: {e!r}")
+        finally:
+            self._refreshing.pop(key, None)
+
+    async def get_or_fetch(self, latitude, longitude, fetch):
+        """
+        Return the cached forecast for the grid cell of (latitude, longitude).
+        `fetch(latitude, longitude)` is awaited with the snapped coordinates on a miss.
+        """
+        key = self.key(latitude, longitude)
+        entry = self._entries.get(key)
+        if entry is not None:
+            fetched_at, value = entry
+            age = time.monotonic() - fetched_at
+            if age < self.ttl:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._entries.move_to_end(key)
+                if key not in self._refreshing:
+                    self._refreshing[key] = asyncio.create_task(self._refresh(key, fetch))
+                return value
+            del self._entries[key]
+
+        self.misses += 1
+        value = await fetch(key[0], key[1])
+        self._store(key, value)
+        return value
+
+    def peek(self, latitude, longitude):
+        """Cached forecast of the grid cell if it is fresh or still inside the stale window, else None."""
+        entry = self._entries.get(self.key(latitude, longitude))
+        if entry is None or time.monotonic() - entry[0] >= self.ttl + self.stale_ttl:
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def put(self, latitude, longitude, value):
+        """Store a forecast fetched outside get_or_fetch, e.g. by a batched multi-coordinate request."""
+        self.misses += 1
+        self._store(self.key(latitude, longitude), value)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "refresh_failures": self.refresh_failures,
+            "refreshing": len(self._refreshing),
+        }
+
+
+weather_cache = WeatherCache()
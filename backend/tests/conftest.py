@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Run from anywhere: the backend modules are imported as the `app` package, like uvicorn does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Importing the app modules creates the database engine; the tests never connect to it
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
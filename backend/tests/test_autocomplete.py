@@ -0,0 +1,49 @@
+from app.autocomplete import PrefixIndex
+from app.models import PlantModel
+
+
+def make_plant(code, name, common_names=None, synonyms=None):
+    return PlantModel(
+        EcoPortCode=code, ScientificName=name, AUTH=None, FAMNAME=None, SYNO=synonyms, COMNAME=common_names,
+        LIFO=None, HABI=None, LISPA=None, PHYS=None, CAT=None, PLAT=None,
+        TOPMN=15.0, TOPMX=25.0, TMIN=5.0, TMAX=35.0, ROPMN=600.0, ROPMX=1200.0, RMIN=300.0, RMAX=2000.0,
+        KTMP=0.0, GMIN=60.0, GMAX=120.0,
+    )
+
+
+def build_index(*plants):
+    index = PrefixIndex()
+    for plant in plants:
+        index.add(plant)
+    return index
+
+
+def test_suggestions_keep_the_original_spelling():
+    index = build_index(make_plant(
+        1, "Acacia longifolia",
+        common_names="Golden Wattle, Sydney golden wattle,, Mimosa de hoja larga",
+        synonyms="Acacia longifolia (Andrews) Willd., Mimosa longifolia Andrews",
+    ))
+
+    assert index.complete("GOLDEN w") == [(1, "COMNAME", "Golden Wattle")]
+    assert index.complete("wattle") == [(1, "COMNAME", "Golden Wattle")]
+    assert index.complete("mimosa l") == [(1, "SYNO", "Mimosa longifolia Andrews")]
+    assert index.complete("acacia longifolia (") == [(1, "SYNO", "Acacia longifolia (Andrews) Willd.")]
+
+
+def test_lookup_ignores_case_and_accents():
+    index = build_index(make_plant(2, "Coffea arabica", common_names="Café, Caféier d'Arabie"))
+
+    assert index.complete("cafe") == [(2, "COMNAME", "Café")]
+    assert index.complete("CAFÉIER") == [(2, "COMNAME", "Caféier d'Arabie")]
+
+
+def test_limit_counts_plants_not_matching_names():
+    index = build_index(
+        make_plant(1, "Rosa canina", common_names="Rose, Rosehip, Rosier des chiens"),
+        make_plant(2, "Rosa gallica", common_names="Rose of Provins"),
+        make_plant(3, "Rosmarinus officinalis", common_names="Rosemary"),
+    )
+
+    assert [code for code, _, _ in index.complete("ros", limit=2)] == [1, 2]
+    assert [code for code, _, _ in index.complete("ros", limit=10)] == [1, 2, 3]
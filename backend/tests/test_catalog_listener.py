@@ -0,0 +1,198 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app import catalog as catalog_module
+from app.catalog import CATALOG_CHANNEL, PlantCatalog
+from app.models import PlantModel
+
+
+def make_plant(code, name):
+    return PlantModel(
+        EcoPortCode=code, ScientificName=name, AUTH=None, FAMNAME=None, SYNO=None, COMNAME=None,
+        LIFO=None, HABI=None, LISPA=None, PHYS=None, CAT=None, PLAT=None,
+        TOPMN=15.0, TOPMX=25.0, TMIN=5.0, TMAX=35.0, ROPMN=600.0, ROPMX=1200.0, RMIN=300.0, RMAX=2000.0,
+        KTMP=0.0, GMIN=60.0, GMAX=120.0,
+    )
+
+
+class FakeDatabase:
+    """Plant table shared by the fake sessions; `failures` makes the next calls raise."""
+
+    def __init__(self, plants):
+        self.plants = {plant.EcoPortCode: plant for plant in plants}
+        self.failures = 0
+        # Awaited by execute() after the table is read, to interleave notifications with a load
+        self.after_read = None
+
+    def _maybe_fail(self):
+        if self.failures:
+            self.failures -= 1
+            raise OperationalError("SELECT", {}, ConnectionResetError("connection reset"))
+
+    def session(self):
+        database = self
+
+        class Session:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc_info):
+                return False
+
+            async def execute(self, statement):
+                database._maybe_fail()
+                plants = [database.plants[code] for code in sorted(database.plants)]
+                if database.after_read is not None:
+                    await database.after_read()
+                return SimpleNamespace(scalars=lambda: SimpleNamespace(all=lambda: plants))
+
+            async def get(self, model, code):
+                database._maybe_fail()
+                return database.plants.get(code)
+
+        return Session()
+
+
+class FakeDriverConnection:
+    """The asyncpg connection API used by the catalog listener."""
+
+    def __init__(self):
+        self.listeners = {}
+        self.termination_listeners = []
+
+    async def add_listener(self, channel, callback):
+        self.listeners[channel] = callback
+
+    def add_termination_listener(self, callback):
+        self.termination_listeners.append(callback)
+
+    def remove_termination_listener(self, callback):
+        self.termination_listeners.remove(callback)
+
+    def notify(self, payload):
+        self.listeners[CATALOG_CHANNEL](self, 0, CATALOG_CHANNEL, payload)
+
+    def terminate(self):
+        for callback in list(self.termination_listeners):
+            callback(self)
+
+
+class FakeEngine:
+    dialect = SimpleNamespace(name="postgresql")
+
+    def __init__(self):
+        self.connections = []
+        self.connect_failures = 0
+
+    async def connect(self):
+        if self.connect_failures:
+            self.connect_failures -= 1
+            raise ConnectionRefusedError("database is restarting")
+        driver_connection = FakeDriverConnection()
+        self.connections.append(driver_connection)
+
+        async def get_raw_connection():
+            return SimpleNamespace(driver_connection=driver_connection)
+
+        async def invalidate():
+            pass
+
+        return SimpleNamespace(get_raw_connection=get_raw_connection, invalidate=invalidate)
+
+
+@pytest.fixture
+def database(monkeypatch):
+    database = FakeDatabase([make_plant(1, "Zea mays"), make_plant(2, "Rosa")])
+    monkeypatch.setattr(catalog_module, "async_session_maker", database.session)
+    monkeypatch.setattr(catalog_module, "CATALOG_RETRY_SECONDS", 0.01)
+    return database
+
+
+async def settle():
+    """Let background refresh, reload and reconnect tasks run."""
+    for _ in range(20):
+        await asyncio.sleep(0.01)
+
+
+def test_notification_refreshes_a_single_plant(database):
+    async def scenario():
+        catalog, engine = PlantCatalog(), FakeEngine()
+        await catalog.listen(engine)
+        await catalog.load(database.session())
+
+        database.plants[1] = make_plant(1, "Zea mays subsp. mays")
+        del database.plants[2]
+        engine.connections[0].notify("1")
+        engine.connections[0].notify("2")
+        await settle()
+
+        assert catalog.get(1).ScientificName == "Zea mays subsp. mays"
+        assert catalog.get(2) is None
+        await catalog.stop()
+        assert engine.connections[0].termination_listeners == []
+
+    asyncio.run(scenario())
+
+
+def test_changes_notified_during_load_are_refreshed_afterwards(database):
+    async def scenario():
+        catalog, engine = PlantCatalog(), FakeEngine()
+        await catalog.listen(engine)
+
+        async def commit_after_read():
+            # Another replica commits after this load read the table; its refresh must not be overwritten
+            database.plants[3] = make_plant(3, "Sorghum bicolor")
+            engine.connections[0].notify("3")
+            await settle()
+
+        database.after_read = commit_after_read
+        await catalog.load(database.session())
+        await settle()
+
+        assert catalog.get(3).ScientificName == "Sorghum bicolor"
+
+    asyncio.run(scenario())
+
+
+def test_failed_refresh_reloads_the_catalog(database):
+    async def scenario():
+        catalog, engine = PlantCatalog(), FakeEngine()
+        await catalog.listen(engine)
+        await catalog.load(database.session())
+
+        database.plants[2] = make_plant(2, "Rosa canina")
+        database.failures = 2
+        engine.connections[0].notify("2")
+        await settle()
+
+        assert catalog.get(2).ScientificName == "Rosa canina"
+        assert database.failures == 0
+
+    asyncio.run(scenario())
+
+
+def test_lost_listener_reconnects_and_reloads(database):
+    async def scenario():
+        catalog, engine = PlantCatalog(), FakeEngine()
+        await catalog.listen(engine)
+        await catalog.load(database.session())
+
+        # Changes committed while disconnected are never notified
+        engine.connect_failures = 2
+        engine.connections[0].terminate()
+        database.plants[4] = make_plant(4, "Pennisetum glaucum")
+        await settle()
+
+        assert len(engine.connections) == 2
+        assert catalog.get(4).ScientificName == "Pennisetum glaucum"
+
+        database.plants[1] = make_plant(1, "Zea mays subsp. mays")
+        engine.connections[1].notify("1")
+        await settle()
+        assert catalog.get(1).ScientificName == "Zea mays subsp. mays"
+        await catalog.stop()
+
+    asyncio.run(scenario())
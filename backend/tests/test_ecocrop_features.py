@@ -0,0 +1,180 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.ecocrop_transformer import MULTI_HOT_COLUMNS, add_additional_features, score_to_label
+
+DERIVED_COLUMNS = [
+    "IS_DROUGHT_TOLERANT", "IS_DROUGHT_SUSCEPTIBLE", "IS_FIRE_TOLERANT", "IS_FIRE_SUSCEPTIBLE",
+    "IS_SALINE_TOLERANT", "IS_SALINE_INTOLERANT", "IS_MULTIPLE_PHOTO_PERIODS",
+    "SOIL_TEXTURE_FLEXIBILITY_SCORE", "IS_SOIL_TEXTURE_TOLERANT",
+    "IS_HIGH_TEMPERATURE_TOLERANT", "IS_LOW_TEMPERATURE_TOLERANT",
+    "GROWTH_CYCLE_DAYS", "IS_FAST_CYCLE",
+    "PRECIP_RANGE_WIDTH", "IS_WIDE_PRECIP_TOLERANCE", "PH_RANGE_WIDTH", "IS_PH_FLEXIBLE",
+    "TEMP_RANGE_WIDTH", "IS_TEMP_FLEXIBLE",
+    "CLIZ_ZONE_COUNT", "HAS_MULTIPLE_COMMON_NAMES", "IS_SHALLOW_ROOTED", "IS_SHORT_DAY",
+    "CLIMATE_ADAPT_SCORE", "SOIL_ADAPT_SCORE", "WATER_ADAPT_SCORE",
+    "ADAPTABILITY_SCORE", "ADAPTABILITY_LABEL",
+]
+
+
+def reference_add_additional_features(df):
+    """The original row-wise implementation, kept as the reference for the vectorized one."""
+    df["IS_DROUGHT_TOLERANT"] = df["ABITOL_LIST"].apply(lambda x: "drought" in x if isinstance(x, list) else False)
+    df["IS_DROUGHT_SUSCEPTIBLE"] = df["ABISUS_LIST"].apply(lambda x: "drought" in x if isinstance(x, list) else False)
+
+    df["IS_FIRE_TOLERANT"] = df["ABITOL_LIST"].apply(lambda x: "fire" in x if isinstance(x, list) else False)
+    df["IS_FIRE_SUSCEPTIBLE"] = df["ABISUS_LIST"].apply(lambda x: "fire" in x if isinstance(x, list) else False)
+
+    df["IS_SALINE_TOLERANT"] = df["SALR_LIST"].apply(lambda x: "high" in x if isinstance(x, list) else False)
+    df["IS_SALINE_INTOLERANT"] = df["SALR_LIST"].apply(lambda x: "low" in x if isinstance(x, list) else False)
+
+    df["IS_MULTIPLE_PHOTO_PERIODS"] = df["PHOTO_LIST"].apply(
+        lambda x: len(set(x)) > 1 if isinstance(x, list) else False
+    )
+
+    df["SOIL_TEXTURE_FLEXIBILITY_SCORE"] = df["TEXT_LIST"].apply(
+        lambda x: len(set(x)) if isinstance(x, list) else 0
+    )
+    df["IS_SOIL_TEXTURE_TOLERANT"] = df["SOIL_TEXTURE_FLEXIBILITY_SCORE"] >= 3
+
+    df["IS_HIGH_TEMPERATURE_TOLERANT"] = df["TMAX"].apply(lambda x: x >= 40 if pd.notna(x) else False)
+    df["IS_LOW_TEMPERATURE_TOLERANT"] = df["TMIN"].apply(lambda x: x <= 10 if pd.notna(x) else False)
+
+    df["GROWTH_CYCLE_DAYS"] = df["GMAX"] - df["GMIN"]
+    df["IS_FAST_CYCLE"] = df["GROWTH_CYCLE_DAYS"] <= 90
+
+    df["PRECIP_RANGE_WIDTH"] = df.apply(
+        lambda row: float(row["RMAX"]) - float(row["RMIN"])
+        if pd.notna(row["RMAX"]) and pd.notna(row["RMIN"]) else None,
+        axis=1,
+    )
+    df["IS_WIDE_PRECIP_TOLERANCE"] = df["PRECIP_RANGE_WIDTH"] > 1500
+
+    df["PH_RANGE_WIDTH"] = df.apply(
+        lambda row: float(row["PHMAX"]) - float(row["PHMIN"])
+        if pd.notna(row["PHMAX"]) and pd.notna(row["PHMIN"]) else None,
+        axis=1,
+    )
+    df["IS_PH_FLEXIBLE"] = df["PH_RANGE_WIDTH"] >= 2
+
+    df["TEMP_RANGE_WIDTH"] = df.apply(
+        lambda row: float(row["TMAX"]) - float(row["TMIN"])
+        if pd.notna(row["TMAX"]) and pd.notna(row["TMIN"]) else None,
+        axis=1,
+    )
+    df["IS_TEMP_FLEXIBLE"] = df["TEMP_RANGE_WIDTH"] >= 20
+
+    df["CLIZ_ZONE_COUNT"] = df["CLIZ_LIST"].apply(lambda x: len(x) if isinstance(x, list) else 0)
+
+    df["HAS_MULTIPLE_COMMON_NAMES"] = df["COMNAME_LIST"].apply(
+        lambda x: len(x) > 3 if isinstance(x, list) else False
+    )
+
+    df["IS_SHALLOW_ROOTED"] = df["DEPR_LIST"].apply(
+        lambda x: any("shallow" in val for val in x) if isinstance(x, list) else False
+    )
+
+    df["IS_SHORT_DAY"] = df["PHOTO_LIST"].apply(
+        lambda x: "short day" in x if isinstance(x, list) else False
+    )
+
+    df["CLIMATE_ADAPT_SCORE"] = (
+            (df["TEMP_RANGE_WIDTH"] / 30).clip(upper=1.0).fillna(0) +
+            df["IS_TEMP_FLEXIBLE"].astype(int) +
+            df["IS_HIGH_TEMPERATURE_TOLERANT"].astype(int) +
+            df["IS_LOW_TEMPERATURE_TOLERANT"].astype(int) +
+            (df["CLIZ_ZONE_COUNT"] / 7).clip(upper=1.0)
+    )
+    df["CLIMATE_ADAPT_SCORE"] = df["CLIMATE_ADAPT_SCORE"] / 5.0
+
+    df["SOIL_ADAPT_SCORE"] = (
+            df["IS_SOIL_TEXTURE_TOLERANT"].astype(int) +
+            (df["PH_RANGE_WIDTH"] / 3).clip(upper=1.0).fillna(0) +
+            df["IS_PH_FLEXIBLE"].astype(int)
+    )
+    df["SOIL_ADAPT_SCORE"] = df["SOIL_ADAPT_SCORE"] / 3.0
+
+    df["WATER_ADAPT_SCORE"] = (
+                                      df["IS_DROUGHT_TOLERANT"].astype(int) +
+                                      df["IS_WIDE_PRECIP_TOLERANCE"].astype(int)
+                              ) / 2.0
+
+    df["ADAPTABILITY_SCORE"] = (
+            0.4 * df["CLIMATE_ADAPT_SCORE"] +
+            0.35 * df["SOIL_ADAPT_SCORE"] +
+            0.25 * df["WATER_ADAPT_SCORE"]
+    ).round(3)
+    df["ADAPTABILITY_LABEL"] = df["ADAPTABILITY_SCORE"].apply(score_to_label)
+
+    return df
+
+
+@pytest.fixture
+def features_frame():
+    """A few hand-written plants: NaN ranges, cells that are not lists, duplicates and a non-contiguous index."""
+    rows = [
+        {
+            "ABITOL_LIST": ["drought", "fire"], "ABISUS_LIST": [], "SALR_LIST": ["high", "medium"],
+            "PHOTO_LIST": ["short day", "neutral day"], "TEXT_LIST": ["heavy", "medium", "light", "medium"],
+            "CLIZ_LIST": ["tropical wet & dry (aw)", "steppe or semi-arid (bs)"],
+            "COMNAME_LIST": ["millet", "pearl millet", "bajra", "cattail millet"],
+            "DEPR_LIST": ["shallow (20-50 cm)"],
+            "TMIN": 12.0, "TMAX": 42.0, "GMIN": 60.0, "GMAX": 120.0,
+            "RMIN": 200.0, "RMAX": 1800.0, "PHMIN": 4.5, "PHMAX": 8.0,
+        },
+        {
+            "ABITOL_LIST": None, "ABISUS_LIST": ["drought", "fire"], "SALR_LIST": ["low"],
+            "PHOTO_LIST": ["short day", "short day"], "TEXT_LIST": ["medium"],
+            "CLIZ_LIST": ["temperate oceanic (do)", "temperate oceanic (do)"],
+            "COMNAME_LIST": "rose", "DEPR_LIST": ["medium (50-150 cm)", "deep (>>150 cm)"],
+            "TMIN": np.nan, "TMAX": 30.0, "GMIN": np.nan, "GMAX": 200.0,
+            "RMIN": np.nan, "RMAX": 900.0, "PHMIN": 5.5, "PHMAX": 7.5,
+        },
+        {
+            "ABITOL_LIST": "", "ABISUS_LIST": np.nan, "SALR_LIST": "", "PHOTO_LIST": [],
+            "TEXT_LIST": np.nan, "CLIZ_LIST": "", "COMNAME_LIST": [], "DEPR_LIST": "shallow",
+            "TMIN": np.nan, "TMAX": np.nan, "GMIN": np.nan, "GMAX": np.nan,
+            "RMIN": np.nan, "RMAX": np.nan, "PHMIN": np.nan, "PHMAX": np.nan,
+        },
+        {
+            "ABITOL_LIST": ["saline"], "ABISUS_LIST": ["insects"], "SALR_LIST": ["high", "low"],
+            "PHOTO_LIST": ["long day"], "TEXT_LIST": ["organic", "light", "heavy"],
+            "CLIZ_LIST": [
+                "tropical wet & dry (aw)", "tropical wet (ar)", "steppe or semi-arid (bs)",
+                "subtropical humid (cf)", "subtropical summer rain (cw)", "temperate oceanic (do)",
+                "temperate continental (dc)", "boreal (e)",
+            ],
+            "COMNAME_LIST": ["a", "b", "c"], "DEPR_LIST": ["shallow (20-50 cm)", "medium (50-150 cm)"],
+            "TMIN": -5.0, "TMAX": 35.0, "GMIN": 30.0, "GMAX": 90.0,
+            "RMIN": 300.0, "RMAX": 1800.0, "PHMIN": 6.0, "PHMAX": np.nan,
+        },
+        {
+            "ABITOL_LIST": ["drought"], "ABISUS_LIST": [], "SALR_LIST": [], "PHOTO_LIST": ["day neutral"],
+            "TEXT_LIST": ["light", "light", "light"], "CLIZ_LIST": ["desert or arid (bw)"],
+            "COMNAME_LIST": ["x", "y", "z", "w", "v"], "DEPR_LIST": [],
+            "TMIN": 10.0, "TMAX": 40.0, "GMIN": 100.0, "GMAX": 100.0,
+            "RMIN": 100.0, "RMAX": 1600.5, "PHMIN": 5.0, "PHMAX": 7.0,
+        },
+    ]
+    df = pd.DataFrame(rows, index=[7, 3, 42, 0, 19])
+    for column in MULTI_HOT_COLUMNS:
+        if column not in df:
+            df[column] = pd.Series([[] for _ in range(len(df))], index=df.index)
+    return df
+
+
+def test_add_additional_features_matches_row_wise_reference(features_frame):
+    expected = reference_add_additional_features(features_frame.copy())
+    actual = add_additional_features(features_frame.copy())
+
+    pd.testing.assert_frame_equal(actual[DERIVED_COLUMNS], expected[DERIVED_COLUMNS])
+
+
+def test_add_additional_features_matches_reference_on_reordered_rows(features_frame):
+    shuffled = features_frame.sample(frac=1.0, random_state=1)
+    expected = reference_add_additional_features(shuffled.copy())
+    actual = add_additional_features(shuffled.copy())
+
+    pd.testing.assert_frame_equal(actual[DERIVED_COLUMNS], expected[DERIVED_COLUMNS])
+    assert list(actual.index) == list(shuffled.index)
@@ -0,0 +1,119 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app import rag_answer
+from app.http_client import AsyncHttpClient
+from app.rag_answer import CHARS_PER_TOKEN, build_context, stream_answer
+
+LLM_BASE_URL = "http://llm.test/v1"
+
+RECORDS = [
+    {"item_id": 1, "scientific_name": "Pennisetum glaucum", "distance": 0.71, "rag_chunk_text": "Pearl millet tolerates drought."},
+    {"item_id": 2, "scientific_name": "Sorghum bicolor", "distance": 0.65, "rag_chunk_text": "Sorghum grows on poor soils."},
+]
+
+
+def completion_chunk(text):
+    return "data: " + json.dumps({"choices": [{"delta": {"content": text}}]}) + "\n\n"
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    """Points the chat completions client at a MockTransport; set `llm.respond` to the upstream response."""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return handler.respond(request)
+
+    client = AsyncHttpClient()
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(rag_answer, "http_client", client)
+    monkeypatch.setattr(rag_answer, "LLM_BASE_URL", LLM_BASE_URL)
+    handler.requests = requests
+    return handler
+
+
+def collect_events(question, records):
+    """Run stream_answer and parse its server-sent events into (event, data) pairs."""
+    async def collect():
+        return "".join([chunk async for chunk in stream_answer(question, records)])
+
+    events = []
+    for block in asyncio.run(collect()).split("\n\n"):
+        if not block:
+            continue
+        fields = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_stream_answer_emits_sources_tokens_done(llm):
+    body = ": keep-alive\n\n" + completion_chunk("Pearl") + completion_chunk(" millet") + \
+        "data: " + json.dumps({"choices": [{"delta": {}}]}) + "\n\n" + "data: [DONE]\n\n" + completion_chunk("ignored")
+    llm.respond = lambda request: httpx.Response(200, content=body.encode(), headers={"Content-Type": "text/event-stream"})
+
+    events = collect_events("Which crops tolerate drought?", RECORDS)
+
+    assert [event for event, _ in events] == ["sources", "token", "token", "done"]
+    assert events[0][1] == [
+        {"item_id": 1, "scientific_name": "Pennisetum glaucum", "distance": 0.71},
+        {"item_id": 2, "scientific_name": "Sorghum bicolor", "distance": 0.65},
+    ]
+    assert [data["text"] for event, data in events if event == "token"] == ["Pearl", " millet"]
+
+    request = llm.requests[0]
+    assert str(request.url) == f"{LLM_BASE_URL}/chat/completions"
+    payload = json.loads(request.content)
+    assert payload["stream"] is True
+    assert "Pearl millet tolerates drought." in payload["messages"][1]["content"]
+
+
+@pytest.mark.parametrize("status_code", [400, 404, 500, 503])
+def test_stream_answer_reports_upstream_errors(llm, status_code):
+    llm.respond = lambda request: httpx.Response(status_code, json={"error": "model not loaded"})
+
+    events = collect_events("Which crops tolerate drought?", RECORDS)
+
+    assert [event for event, _ in events] == ["sources", "error"]
+    assert str(status_code) in events[1][1]["detail"]
+    # Streamed requests are not retried
+    assert len(llm.requests) == 1
+
+
+def test_stream_answer_reports_malformed_chunks(llm):
+    llm.respond = lambda request: httpx.Response(200, content=completion_chunk("Pearl").encode() + b"data: {not json\n\n")
+
+    events = collect_events("Which crops tolerate drought?", RECORDS)
+
+    assert [event for event, _ in events] == ["sources", "token", "error"]
+
+
+def test_build_context_truncates_an_over_budget_first_chunk():
+    records = [
+        {"item_id": 1, "rag_chunk_text": "x" * 100},
+        {"item_id": 2, "rag_chunk_text": "short"},
+    ]
+
+    context, used = build_context(records, token_budget=10)
+
+    assert context == "x" * (10 * CHARS_PER_TOKEN)
+    assert used == records[:1]
+
+
+def test_build_context_stops_at_the_budget_and_skips_duplicates():
+    records = [
+        {"item_id": 1, "rag_chunk_text": "a" * 20},
+        {"item_id": 1, "rag_chunk_text": "a" * 20},
+        {"item_id": 2, "rag_chunk_text": ""},
+        {"item_id": 3, "rag_chunk_text": "b" * 20},
+        {"item_id": 4, "rag_chunk_text": "c" * 40},
+    ]
+
+    context, used = build_context(records, token_budget=15)
+
+    assert context == "a" * 20 + "\n\n" + "b" * 20
+    assert [record["item_id"] for record in used] == [1, 3]
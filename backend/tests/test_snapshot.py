@@ -0,0 +1,51 @@
+import os
+
+import pandas as pd
+import pytest
+
+from app import snapshot
+from app.snapshot import read_snapshot, write_snapshot
+
+
+@pytest.fixture
+def snapshot_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "_verified", set())
+    path = str(tmp_path / "cleaned_ecocrop.arrow")
+    write_snapshot(pd.DataFrame({"EcoPortCode": [1, 2, 3], "TEXT_LIST": [["light"], [], ["heavy", "medium"]]}), path)
+    return path
+
+
+def corrupt_in_place(path):
+    """Flip a byte in the middle of the file, keeping its size and mtime."""
+    stat = os.stat(path)
+    with open(path, "r+b") as f:
+        f.seek(stat.st_size // 2)
+        byte = f.read(1)
+        f.seek(stat.st_size // 2)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+
+def test_read_snapshot_round_trips_list_columns(snapshot_path):
+    df = read_snapshot(snapshot_path)
+
+    assert df["EcoPortCode"].tolist() == [1, 2, 3]
+    assert df["TEXT_LIST"].tolist() == [["light"], [], ["heavy", "medium"]]
+
+
+def test_corruption_keeping_size_and_mtime_is_detected(snapshot_path):
+    corrupt_in_place(snapshot_path)
+
+    with pytest.raises(ValueError, match="checksum"):
+        read_snapshot(snapshot_path)
+
+
+def test_snapshot_is_hashed_once_per_process(snapshot_path, monkeypatch):
+    hashed = []
+    file_sha256 = snapshot._file_sha256
+    monkeypatch.setattr(snapshot, "_file_sha256", lambda path: hashed.append(path) or file_sha256(path))
+
+    read_snapshot(snapshot_path)
+    read_snapshot(snapshot_path, columns=["EcoPortCode"])
+
+    assert hashed == [snapshot_path]
@@ -0,0 +1,150 @@
+import math
+
+import numpy as np
+import pytest
+
+from app.models import PlantModel
+from app.suitability import SuitabilityTable, calculate_suitability_score
+from app.tolerance_matrix import build_tolerance_matrix
+
+DAYS = 16
+
+
+def make_plant(code, temperature, precipitation, latitudes=(None, None, None, None)):
+    """Plant with the given (TOPMN, TOPMX, TMIN, TMAX) and (ROPMN, ROPMX, RMIN, RMAX) ranges."""
+    topmn, topmx, tmin, tmax = temperature
+    ropmn, ropmx, rmin, rmax = precipitation
+    latopmn, latopmx, latmn, latmx = latitudes
+    return PlantModel(
+        EcoPortCode=code, ScientificName=f"Plantae {code}", AUTH=None, FAMNAME=None, SYNO=None, COMNAME=None,
+        LIFO=None, HABI=None, LISPA=None, PHYS=None, CAT=None, PLAT=None,
+        TOPMN=topmn, TOPMX=topmx, TMIN=tmin, TMAX=tmax, ROPMN=ropmn, ROPMX=ropmx, RMIN=rmin, RMAX=rmax,
+        KTMP=0.0, GMIN=60.0, GMAX=120.0,
+        LATOPMN=latopmn, LATOPMX=latopmx, LATMN=latmn, LATMX=latmx,
+    )
+
+
+def random_range(rng, low, high, ordered):
+    """Four breakpoints on a coarse grid, so that equal breakpoints and values on them are common."""
+    values = rng.integers(low, high, size=4).astype(float)
+    if ordered:
+        absolute_min, optimal_min, optimal_max, absolute_max = np.sort(values)
+        return optimal_min, optimal_max, absolute_min, absolute_max
+    return tuple(values)
+
+
+def random_weather(rng, days=DAYS):
+    return {
+        "temperature_2m_min": rng.integers(-15, 30, size=days).astype(float).tolist(),
+        "temperature_2m_max": (rng.integers(0, 45, size=days) + rng.random(days)).tolist(),
+        "temperature_2m_mean": (rng.integers(-5, 35, size=days) + rng.choice([0.0, 0.5], size=days)).tolist(),
+        "precipitation_sum": (rng.random(days) * rng.choice([0.0, 5.0, 40.0])).tolist(),
+    }
+
+
+def random_plants(rng, count):
+    latitude_choices = [(None, None, None, None), (math.nan, math.nan, math.nan, math.nan), (-10.0, 40.0, -30.0, 60.0)]
+    return [
+        make_plant(
+            code,
+            random_range(rng, -10, 45, ordered=rng.random() < 0.8),
+            random_range(rng, 0, 4000, ordered=rng.random() < 0.8),
+            latitude_choices[code % len(latitude_choices)],
+        )
+        for code in range(1, count + 1)
+    ]
+
+
+EDGE_CASE_PLANTS = [
+    # Degenerate ranges: zero-width ramps and a single-point optimum
+    make_plant(1, (10.0, 10.0, 10.0, 10.0), (500.0, 500.0, 500.0, 500.0)),
+    make_plant(2, (15.0, 25.0, 15.0, 25.0), (400.0, 1200.0, 400.0, 1200.0)),
+    make_plant(3, (20.0, 20.0, 5.0, 35.0), (0.0, 0.0, 0.0, 3000.0)),
+    # Unordered breakpoints
+    make_plant(4, (30.0, 20.0, 10.0, 40.0), (1500.0, 800.0, 300.0, 2000.0)),
+    make_plant(5, (20.0, 30.0, 35.0, 5.0), (800.0, 1500.0, 2000.0, 300.0)),
+    make_plant(6, (25.0, 25.0, 30.0, 20.0), (900.0, 900.0, 1000.0, 800.0)),
+    # Unknown tolerances and latitudes
+    make_plant(7, (math.nan, 25.0, 5.0, 35.0), (500.0, math.nan, 200.0, 2000.0), (math.nan, None, math.nan, None)),
+    make_plant(8, (math.nan, math.nan, math.nan, math.nan), (math.nan, math.nan, math.nan, math.nan)),
+    make_plant(9, (18.0, 27.0, 8.0, 36.0), (600.0, 1500.0, 300.0, 2500.0), (-20.0, 20.0, math.nan, None)),
+]
+
+EDGE_CASE_WEATHER = [
+    # Temperatures exactly on the breakpoints of the plants above
+    {
+        "temperature_2m_min": [5.0, 8.0, 10.0, 15.0, 18.0, 20.0],
+        "temperature_2m_max": [25.0, 27.0, 30.0, 35.0, 36.0, 40.0],
+        "temperature_2m_mean": [10.0, 20.0, 25.0, 30.0, 35.0, 45.0],
+        "precipitation_sum": [500.0 * 30 / 365 / 6] * 6,
+    },
+    # Far outside every range, in both directions
+    {
+        "temperature_2m_min": [-40.0, -25.5],
+        "temperature_2m_max": [55.0, 60.0],
+        "temperature_2m_mean": [-30.0, 58.0],
+        "precipitation_sum": [0.0, 0.0],
+    },
+    # Series of different lengths are truncated to the shortest one
+    {
+        "temperature_2m_min": [3.0, 4.0, 5.0, 6.0],
+        "temperature_2m_max": [20.0, 21.0, 22.0],
+        "temperature_2m_mean": [12.0, 13.0, 14.0, 15.0, 16.0],
+        "precipitation_sum": [10.0, 20.0, 30.0, 40.0, 50.0],
+    },
+]
+
+
+def scalar_scores(plants, weather_data):
+    return [calculate_suitability_score(weather_data, plant) for plant in plants]
+
+
+@pytest.mark.parametrize("weather_data", EDGE_CASE_WEATHER)
+def test_edge_cases_match_scalar_score(weather_data):
+    expected = scalar_scores(EDGE_CASE_PLANTS, weather_data)
+    matrix = build_tolerance_matrix(EDGE_CASE_PLANTS)
+
+    assert matrix.score(weather_data).tolist() == expected
+    assert [SuitabilityTable(plant).score(weather_data) for plant in EDGE_CASE_PLANTS] == expected
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_plants_match_scalar_score(seed):
+    rng = np.random.default_rng(seed)
+    plants = random_plants(rng, 200)
+    matrix = build_tolerance_matrix(plants)
+    tables = [SuitabilityTable(plant) for plant in plants]
+
+    for _ in range(10):
+        weather_data = random_weather(rng)
+        expected = scalar_scores(plants, weather_data)
+        assert matrix.score(weather_data).tolist() == expected
+        assert [table.score(weather_data) for table in tables] == expected
+
+
+def test_rank_orders_scalar_scores():
+    rng = np.random.default_rng(42)
+    plants = random_plants(rng, 100)
+    matrix = build_tolerance_matrix(plants)
+    weather_data = random_weather(rng)
+    expected = sorted(
+        ((plant.EcoPortCode, plant.ScientificName, score)
+         for plant, score in zip(plants, scalar_scores(plants, weather_data))),
+        key=lambda ranking: -ranking[2],
+    )
+
+    assert matrix.rank(weather_data) == expected
+    assert matrix.rank(weather_data, limit=10) == expected[:10]
+
+
+def test_subset_scores_match_scalar_score():
+    rng = np.random.default_rng(7)
+    plants = random_plants(rng, 50)
+    codes = [plant.EcoPortCode for plant in plants][::-3]
+    by_code = {plant.EcoPortCode: plant for plant in plants}
+    weather_data = random_weather(rng)
+
+    subset = build_tolerance_matrix(plants).subset(codes)
+
+    assert subset.eco_port_codes.tolist() == codes
+    assert subset.score(weather_data).tolist() == scalar_scores([by_code[code] for code in codes], weather_data)
@@ -1,55 +1,223 @@
+import asyncio
+import hashlib
+import json
 import os
+import random
+import sys
 import pandas as pd
-import requests
-import json
+import pyarrow.feather as feather
+import httpx
 from tqdm import tqdm
 from datetime import datetime
 
 RAG_CHUNKS_DIR = "resources/rag_chunks"
+CLEANED_SNAPSHOT_PATH = "resources/cleaned_ecocrop.arrow"
+# Must match SNAPSHOT_VERSION in backend/app/snapshot.py
+SNAPSHOT_VERSION = 1
+CLEANED_JSON_PATH = "resources/cleaned_ecocrop.json"
 OUTPUT_PARQUET_PATH = "data/ecocrop_rag_embeddings.parquet"
+# Vectors of the current chunk texts, keyed by content hash; survives between runs
+EMBEDDING_CACHE_PATH = "data/embedding_cache.parquet"
 EMBEDDING_MODEL_ENDPOINT = "https://models.mylab.th-luebeck.dev/v1/embeddings"
+EMBEDDING_MODEL = "bge-m3"
 HEADERS = {"Content-Type": "application/json"}
 
+# Chunks per /v1/embeddings request and number of requests in flight
+BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 32))
+CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", 4))
+MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", 5))
+REQUEST_TIMEOUT = float(os.getenv("EMBEDDING_REQUEST_TIMEOUT", 120))
+# Progress is written to the embedding cache after this many completed batches
+CHECKPOINT_EVERY = int(os.getenv("EMBEDDING_CHECKPOINT_EVERY", 10))
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
 
-def load_rag_chunk(idx):
-    chunk_path = os.path.join(RAG_CHUNKS_DIR, f"{idx}.txt")
+
+def load_rag_chunk(eco_port_code):
+    chunk_path = os.path.join(RAG_CHUNKS_DIR, f"{eco_port_code}.txt")
     with open(chunk_path, "r", encoding="utf-8") as f:
         return f.read()
 
 
-def get_embedding(text):
-    payload = {"input": text, "model": "bge-m3"}
-    response = requests.post(EMBEDDING_MODEL_ENDPOINT, headers=HEADERS, data=json.dumps(payload))
-    response.raise_for_status()
-    return response.json()["data"][0]["embedding"]
+def load_rag_bundle():
+    """EcoPortCode → text from a single-file export (rag_chunks.jsonl/.parquet), or None if there is none."""
+    parquet_path = os.path.join(RAG_CHUNKS_DIR, "rag_chunks.parquet")
+    jsonl_path = os.path.join(RAG_CHUNKS_DIR, "rag_chunks.jsonl")
+    if os.path.exists(parquet_path):
+        bundle = pd.read_parquet(parquet_path)
+    elif os.path.exists(jsonl_path):
+        bundle = pd.read_json(jsonl_path, lines=True)
+    else:
+        return None
+    return dict(zip(bundle["EcoPortCode"].astype(int), bundle["text"]))
 
 
-def main():
-    df = pd.read_json("resources/cleaned_ecocrop.json")
+def snapshot_is_valid(path):
+    """
+    Check a snapshot against its manifest like backend/app/snapshot.py does: the version must match
+    and the file its SHA-256.
+    """
+    try:
+        with open(f"{path}.json") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != SNAPSHOT_VERSION:
+            print(f"⚠️ Ignoring snapshot {path}: version {manifest.get('version')} != {SNAPSHOT_VERSION}")
+            return False
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Ignoring snapshot {path}: {e!r}")
+        return False
+    if digest.hexdigest() != manifest.get("sha256"):
+        print(f"⚠️ Ignoring snapshot {path}: checksum mismatch")
+        return False
+    return True
 
-    records = []
-    now = datetime.utcnow()
 
-    print("🔄 Generating embeddings...")
-    for idx, row in tqdm(df.iterrows(), total=len(df)):
+def load_cleaned_dataset(columns):
+    # Prefer the memory-mapped Arrow snapshot written by the transformer over the JSON export
+    if os.path.exists(CLEANED_SNAPSHOT_PATH) and snapshot_is_valid(CLEANED_SNAPSHOT_PATH):
+        return feather.read_table(CLEANED_SNAPSHOT_PATH, columns=columns, memory_map=True).to_pandas()
+    return pd.read_json(CLEANED_JSON_PATH)[columns]
+
+
+def content_hash(text, model=EMBEDDING_MODEL):
+    """Cache key of a chunk: identical text embedded with the same model yields the same vector."""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+def load_embedding_cache(path=EMBEDDING_CACHE_PATH):
+    """Content hash → vector of all previously embedded chunks, including those of interrupted runs."""
+    if not os.path.exists(path):
+        return {}
+    df = pd.read_parquet(path)
+    return dict(zip(df["content_hash"], df["vector"]))
+
+
+def write_parquet(df, path):
+    # Write to a temporary file first so that a crash never leaves a truncated Parquet file behind
+    tmp_path = f"{path}.tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def write_embedding_cache(cache, path=EMBEDDING_CACHE_PATH):
+    write_parquet(pd.DataFrame({"content_hash": list(cache), "vector": list(cache.values())}), path)
+
+
+def batched(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+async def get_embeddings(client, texts):
+    """Embed a batch of texts in one request, retrying throttled and failed requests with backoff."""
+    payload = {"input": texts, "model": EMBEDDING_MODEL}
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            response = await client.post(EMBEDDING_MODEL_ENDPOINT, headers=HEADERS, json=payload)
+            if response.status_code not in RETRY_STATUS_CODES:
+                response.raise_for_status()
+                data = sorted(response.json()["data"], key=lambda item: item["index"])
+                if len(data) != len(texts):
+                    raise ValueError(f"Expected {len(texts)} embeddings, got {len(data)}")
+                return [item["embedding"] for item in data]
+            error = f"HTTP {response.status_code}"
+        except httpx.TransportError as e:
+            error = repr(e)
+        if attempt == MAX_RETRIES:
+            raise RuntimeError(f"Embedding request failed after {MAX_RETRIES + 1} attempts: {error}")
+        await asyncio.sleep(min(2 ** attempt, 30) + random.uniform(0, 1))
+
+
+async def embed_chunks(chunks, on_batch):
+    """
+    Embed (content_hash, text) chunks in batches with bounded concurrency.
+    on_batch(hashes, embeddings) is called for every completed batch. Returns the hashes of failed batches.
+    """
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    failed = []
+
+    async def embed_batch(client, batch):
+        async with semaphore:
+            try:
+                embeddings = await get_embeddings(client, [text for _, text in batch])
+            except (httpx.HTTPError, RuntimeError, ValueError, KeyError) as e:
+                print(f"⚠️ Failed to embed a batch of {len(batch)} chunks: {e}")
+                failed.extend(chunk_hash for chunk_hash, _ in batch)
+                return
+        on_batch([chunk_hash for chunk_hash, _ in batch], embeddings)
+
+    limits = httpx.Limits(max_connections=CONCURRENCY)
+    async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT, limits=limits) as client:
+        await asyncio.gather(*(embed_batch(client, batch) for batch in batched(chunks, BATCH_SIZE)))
+    return failed
+
+
+def main():
+    df = load_cleaned_dataset(["EcoPortCode", "ScientificName"])
+
+    cache = load_embedding_cache()
+    bundle = load_rag_bundle()
+    chunks = []
+    missing = []
+    for code, scientific_name in zip(df["EcoPortCode"], df["ScientificName"]):
         try:
-            text = load_rag_chunk(idx)
-            embedding = get_embedding(text)
-            record = {
-                "item_id": idx,
-                "vector": embedding,
-                "rag_chunk_text": text,
-                "scientific_name": row["ScientificName"],
-                "event_timestamp": now
-            }
-            records.append(record)
-        except Exception as e:
-            print(f"⚠️ Skipping row {idx} due to error: {e}")
+            text = bundle[int(code)] if bundle is not None else load_rag_chunk(code)
+        except (OSError, KeyError):
+            missing.append(code)
             continue
+        chunks.append((int(code), scientific_name, text, content_hash(text)))
+    if missing:
+        print(f"⚠️ No RAG chunk file for {len(missing)} plants, e.g. {missing[:5]}")
+
+    # Drop the vectors of texts that are gone or changed: their hash (which includes the model) matches no chunk
+    current_hashes = {chunk_hash for _, _, _, chunk_hash in chunks}
+    stale = [chunk_hash for chunk_hash in cache if chunk_hash not in current_hashes]
+    for chunk_hash in stale:
+        del cache[chunk_hash]
+    if stale:
+        print(f"🧹 Pruning {len(stale)} outdated entries from the embedding cache")
+
+    # Only new or changed texts are sent to the model; identical texts are embedded once
+    pending = {chunk_hash: text for _, _, text, chunk_hash in chunks if chunk_hash not in cache}
+    print(f"♻️ {len(chunks) - len(pending)} of {len(chunks)} chunks unchanged since the last run")
 
-    output_df = pd.DataFrame(records)
-    output_df.to_parquet(OUTPUT_PARQUET_PATH, index=False)
-    print(f"✅ Saved embeddings to {OUTPUT_PARQUET_PATH}")
+    print(f"🔄 Generating embeddings for {len(pending)} chunks...")
+    progress = tqdm(total=len(pending))
+    completed_batches = 0
+
+    def on_batch(hashes, embeddings):
+        nonlocal completed_batches
+        cache.update(zip(hashes, embeddings))
+        progress.update(len(hashes))
+        completed_batches += 1
+        if completed_batches % CHECKPOINT_EVERY == 0:
+            write_embedding_cache(cache)
+
+    failed = asyncio.run(embed_chunks(list(pending.items()), on_batch)) if pending else []
+    progress.close()
+    if pending or stale:
+        write_embedding_cache(cache)
+
+    now = datetime.utcnow()
+    records = [
+        {
+            "item_id": code,
+            "vector": cache[chunk_hash],
+            "rag_chunk_text": text,
+            "scientific_name": scientific_name,
+            "event_timestamp": now
+        }
+        for code, scientific_name, text, chunk_hash in chunks
+        if chunk_hash in cache
+    ]
+    write_parquet(pd.DataFrame(records), OUTPUT_PARQUET_PATH)
+    print(f"✅ Saved {len(records)} embeddings to {OUTPUT_PARQUET_PATH}")
+    if failed:
+        print(f"❌ {len(failed)} chunks could not be embedded; run again to retry them")
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -118,7 +118,7 @@ st.markdown(
 st.title("🌱 Gardening Helper 🧑‍🌾")
 
 # Fetch all plant names from the backend API
-plants_url = f"{api_url}/plants/"
+plants_url = f"{api_url}/plants/?fields=ScientificName"
 print(plants_url)
 plants_response = requests.get(plants_url)
 